@@ -1,5 +1,6 @@
-from fastapi import Header, HTTPException
+from fastapi import Header, HTTPException, Query
 from dotenv import load_dotenv
+from typing import Optional
 import os
 
 load_dotenv()
@@ -8,3 +9,9 @@ API_KEY = os.getenv("API_KEY")
 def verify_api_key(x_api_key: str = Header(...)):
     if x_api_key != API_KEY:
         raise HTTPException(status_code=403, detail="Invalid API Key")
+
+def verify_api_key_or_query(x_api_key: Optional[str] = Header(None), api_key: Optional[str] = Query(None)):
+    # EventSource cannot set headers, so streams also accept ?api_key=
+    key = x_api_key or api_key
+    if key is None or key != API_KEY:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
@@ -0,0 +1,137 @@
+"""
+PocketBase (cloud-monitoring) client
+Keeps the API token in memory, refreshing it on 401/403, and pages through the
+systems collection so one pull covers every Server Cloud service
+"""
+import os
+import threading
+
+import requests
+
+from app.db import get_connection
+from app.http_client import http_client
+
+CLOUD_BASE_URL = "https://cloud-monitoring.corp.spc.int"
+CLOUD_CONFIG_NAME = "cloud-monitoring.corp.spc.int"
+CLOUD_SYSTEMS_URL = f"{CLOUD_BASE_URL}/api/collections/systems/records"
+CLOUD_AUTH_URL = f"{CLOUD_BASE_URL}/api/collections/users/auth-with-password"
+CLOUD_IDENTITY = os.getenv('CLOUD_IDENTITY')  # PocketBase login, only needed to replace a missing or rejected token
+CLOUD_PASSWORD = os.getenv('CLOUD_PASSWORD')
+CLOUD_PAGE_SIZE = int(os.getenv('CLOUD_PAGE_SIZE', '500'))  # PocketBase caps perPage at 500
+CLOUD_NOT_CONFIGURED = "Cloud monitoring not configured: set CLOUD_IDENTITY and CLOUD_PASSWORD"
+
+
+def cloud_configured() -> bool:
+    return bool(CLOUD_IDENTITY and CLOUD_PASSWORD)
+
+
+def get_stored_token():
+    """Read the token saved in dashboard_configs"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT configuration FROM dashboard_configs WHERE name = %s", (CLOUD_CONFIG_NAME,))
+            result = cur.fetchone()
+            return result[0] if result else None
+
+
+def authenticate_and_store_token():
+    """Log in to PocketBase and save the new token in dashboard_configs"""
+    if not cloud_configured():
+        raise Exception(CLOUD_NOT_CONFIGURED)
+    print(f"Authenticating to {CLOUD_AUTH_URL}...")
+    response = http_client.post(
+        CLOUD_AUTH_URL,
+        upstream="pocketbase",
+        headers={'Content-Type': 'application/json'},
+        json={"identity": CLOUD_IDENTITY, "password": CLOUD_PASSWORD},
+        verify=False,
+        timeout=30
+    )
+    response.raise_for_status()
+    token = response.json().get("token")
+    if not token:
+        raise Exception("Failed to retrieve token from authentication response")
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO dashboard_configs (name, configuration)
+                VALUES (%s, %s)
+                ON CONFLICT (name)
+                DO UPDATE SET configuration = EXCLUDED.configuration
+            """, (CLOUD_CONFIG_NAME, token))
+            conn.commit()
+    return token
+
+
+class CloudTokenStore:
+    """In-memory copy of the PocketBase token shared by every cloud request"""
+
+    def __init__(self):
+        self._token = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Current token, loading it from the database the first time"""
+        with self._lock:
+            if self._token is None:
+                self._token = get_stored_token()
+            return self._token
+
+    def set(self, token):
+        with self._lock:
+            self._token = token
+
+    def refresh(self, rejected_token):
+        """Replace a token the API rejected.
+
+        Another process may already have re-authenticated, so the database
+        copy is tried before logging in again.
+        """
+        with self._lock:
+            if self._token != rejected_token:
+                return self._token  # another thread already refreshed it
+            stored = get_stored_token()
+            if stored and stored != rejected_token:
+                self._token = stored
+            else:
+                self._token = authenticate_and_store_token()
+            return self._token
+
+
+def fetch_all_systems(token_store, page_size: int = CLOUD_PAGE_SIZE) -> list:
+    """Page through the systems collection and return every record"""
+    token = token_store.get()
+    if not token:
+        token = token_store.refresh(None)
+
+    items = []
+    page = 1
+    refreshed = False
+    while True:
+        response = http_client.get(
+            CLOUD_SYSTEMS_URL,
+            upstream="pocketbase",
+            params={"page": page, "perPage": page_size},
+            headers={"Authorization": f"Bearer {token}"},
+            verify=False,
+            timeout=30
+        )
+        if response.status_code in (401, 403) and not refreshed:
+            token = token_store.refresh(token)
+            refreshed = True
+            continue
+        if response.status_code != 200:
+            raise requests.exceptions.HTTPError(
+                f"API Error: {response.status_code} - {response.text[:200]}", response=response
+            )
+
+        data = response.json()
+        items.extend(data.get("items", []))
+        if page >= data.get("totalPages", 1) or not data.get("items"):
+            return items
+        page += 1
+
+
+# Global instance
+cloud_token = CloudTokenStore()
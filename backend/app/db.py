@@ -1,34 +1,236 @@
 import psycopg2
+import psycopg2.extensions
 import psycopg2.pool
 import os
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
 
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))  # connections opened up front
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))  # hard cap on open connections
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '10'))  # seconds to wait for a free connection
+DB_POOL_HEALTH_CHECK_IDLE = float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', '5'))  # ping connections idle longer than this
+
+# Upper bounds (ms) of the acquire-latency histogram buckets
+ACQUIRE_LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
 # Global connection pool
 _connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """No connection became free within the acquire timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe connection pool with blocking acquire and usage metrics.
+
+    getconn() waits up to acquire_timeout for a free connection instead of
+    failing as soon as maxconn are in use, checks connections that sat idle
+    for a while before handing them out, and putconn() rolls back anything
+    left open so the next borrower starts clean.
+    """
+
+    def __init__(self, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT, **params):
+        self.minconn = minconn
+        self.maxconn = max(maxconn, 1)
+        self.acquire_timeout = acquire_timeout
+        self.params = params
+        self._idle = deque()  # (connection, monotonic time it was returned)
+        self._cond = threading.Condition()
+        self._size = 0  # open connections, idle or in use
+        self._in_use = 0
+        self._waiters = 0
+        self._closed = False
+        self._acquired = 0
+        self._timeouts = 0
+        self._health_check_failures = 0
+        self._latency_counts = [0] * (len(ACQUIRE_LATENCY_BUCKETS_MS) + 1)  # last bucket is +Inf
+        self._latency_sum_ms = 0.0
+        self._latency_max_ms = 0.0
+
+        for _ in range(min(minconn, self.maxconn)):
+            try:
+                self._idle.append((self._connect(), time.monotonic()))
+                self._size += 1
+            except Exception as e:
+                print(f"Could not pre-open database connection: {e}")
+                break
+
+    def getconn(self, timeout: float = None):
+        """Borrow a connection, waiting up to timeout seconds (default acquire_timeout)"""
+        started = time.monotonic()
+        deadline = started + (self.acquire_timeout if timeout is None else timeout)
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()  # most recently used first
+                    break
+                if self._size < self.maxconn:
+                    conn, returned_at = None, None
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"no database connection free after {time.monotonic() - started:.1f}s "
+                                      f"({self.maxconn} in use)")
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            self._in_use += 1
+
+        # Connect and health-check outside the lock
+        try:
+            if conn is not None and not self._is_healthy(conn, returned_at):
+                with self._cond:
+                    self._health_check_failures += 1
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        self._record_latency((time.monotonic() - started) * 1000)
+        return conn
 
-def get_connection_pool():
-    """Get or create the database connection pool"""
+    def putconn(self, conn, close: bool = False):
+        """Return a borrowed connection; close=True drops it instead of reusing it"""
+        if not close and not conn.closed:
+            try:
+                # Never hand the next borrower an open or aborted transaction
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        with self._cond:
+            self._in_use -= 1
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                reuse = False
+            else:
+                self._idle.append((conn, time.monotonic()))
+                reuse = True
+            self._cond.notify()
+        if not reuse:
+            self._discard(conn)
+
+    def closeall(self):
+        """Close idle connections now and borrowed ones as they come back"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        """Current usage and cumulative acquire metrics"""
+        with self._cond:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(list(ACQUIRE_LATENCY_BUCKETS_MS) + ["+Inf"], self._latency_counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {
+                "min_connections": self.minconn,
+                "max_connections": self.maxconn,
+                "acquire_timeout_seconds": self.acquire_timeout,
+                "open": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "acquired_total": self._acquired,
+                "timeouts_total": self._timeouts,
+                "health_check_failures_total": self._health_check_failures,
+                "acquire_latency_ms": {
+                    "buckets": buckets,  # cumulative counts of acquires taking <= bound ms
+                    "count": self._acquired,
+                    "sum": round(self._latency_sum_ms, 3),
+                    "max": round(self._latency_max_ms, 3),
+                },
+            }
+
+    def _connect(self):
+        return psycopg2.connect(**self.params)
+
+    def _is_healthy(self, conn, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < DB_POOL_HEALTH_CHECK_IDLE:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _record_latency(self, elapsed_ms: float):
+        with self._cond:
+            self._acquired += 1
+            self._latency_sum_ms += elapsed_ms
+            self._latency_max_ms = max(self._latency_max_ms, elapsed_ms)
+            for i, bound in enumerate(ACQUIRE_LATENCY_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    self._latency_counts[i] += 1
+                    return
+            self._latency_counts[-1] += 1
+
+
+def get_connection_pool(minconn: int = None, maxconn: int = None):
+    """Get or create the database connection pool.
+
+    minconn/maxconn override DB_POOL_MIN/DB_POOL_MAX and only apply when this
+    call creates the pool.
+    """
     global _connection_pool
-    if _connection_pool is None:
-        # _connection_pool = psycopg2.pool.SimpleConnectionPool(
-        #     minconn=1,
-        #     maxconn=10,
-        #     dbname=os.getenv('DB_NAME', 'monitoring_db'),
-        #     user=os.getenv('DB_USER', 'postgres'),
-        #     password=os.getenv('DB_PASSWORD', 'postgres'),
-        #     host=os.getenv('DB_HOST', 'localhost'),
-        #     port=os.getenv("DB_PORT", 5432)
-        # )
-        _connection_pool = psycopg2.pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=10,
-            dbname=os.getenv('DB_NAME', 'monitoring_db'),
-            user=os.getenv('DB_USER', 'gem_user'),
-            password=os.getenv('DB_PASSWORD', 'P@ssword123'),
-            host=os.getenv('DB_HOST', 'db'),
-            port=os.getenv("DB_PORT", 5432)
-        )
-    return _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            # Shared by the API threadpool, the daemon's check workers and the result sink
+            _connection_pool = ConnectionPool(
+                minconn=DB_POOL_MIN if minconn is None else minconn,
+                maxconn=DB_POOL_MAX if maxconn is None else maxconn,
+                **get_connection_params()
+            )
+        return _connection_pool
+
+def get_connection_params() -> dict:
+    """Database settings from the environment"""
+    return dict(
+        dbname=os.getenv('DB_NAME', 'monitoring_db'),
+        user=os.getenv('DB_USER', 'gem_user'),
+        password=os.getenv('DB_PASSWORD', 'P@ssword123'),
+        host=os.getenv('DB_HOST', 'db'),
+        port=os.getenv("DB_PORT", 5432)
+    )
+
+def connect():
+    """Open a dedicated connection outside the pool (e.g. for LISTEN)"""
+    return psycopg2.connect(**get_connection_params())
 
 @contextmanager
 def get_connection():
@@ -43,6 +245,7 @@ def get_connection():
 def close_connection_pool():
     """Close the connection pool (call this on application shutdown)"""
     global _connection_pool
-    if _connection_pool:
-        _connection_pool.closeall()
-        _connection_pool = None
\ No newline at end of file
+    with _connection_pool_lock:
+        if _connection_pool:
+            _connection_pool.closeall()
+            _connection_pool = None
@@ -0,0 +1,131 @@
+"""
+Live monitoring events for the API
+One LISTEN connection per API worker receives what results.notify_events
+sends and fans it out to every subscribed client queue, so the number of
+open streams never changes the load on Postgres
+"""
+import asyncio
+import json
+import os
+import select
+import threading
+
+import psycopg2.extensions
+from psycopg2 import sql
+
+from app.db import connect
+from app.results import MONITORING_EVENTS_CHANNEL
+
+EVENTS_HEARTBEAT_INTERVAL = float(os.getenv('EVENTS_HEARTBEAT_INTERVAL', '15'))  # seconds between keep-alive comments
+EVENTS_CLIENT_QUEUE_SIZE = int(os.getenv('EVENTS_CLIENT_QUEUE_SIZE', '1000'))  # events buffered per client
+EVENTS_RECONNECT_DELAY = float(os.getenv('EVENTS_RECONNECT_DELAY', '5'))  # seconds before listening again after an error
+
+RESYNC_EVENT = {"type": "resync"}
+
+
+class EventBus:
+    """Fan-out of monitoring events from one LISTEN connection to many subscribers.
+
+    Subscribers are asyncio queues; the listener thread starts with the first
+    one and hands events to each queue through its event loop. A "resync"
+    event tells a subscriber that events were lost (listener reconnected or
+    the client fell behind) and it should reload its state.
+    """
+
+    def __init__(self, channel: str = MONITORING_EVENTS_CHANNEL):
+        self.channel = channel
+        self._subscribers = {}  # queue -> event loop
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a queue for the calling event loop"""
+        queue = asyncio.Queue(maxsize=EVENTS_CLIENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="event-listener", daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, events: list):
+        """Hand events to every subscriber (thread-safe)"""
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, events)
+            except RuntimeError:  # loop already closed
+                self.unsubscribe(queue)
+
+    def close(self):
+        """Stop the listener thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=EVENTS_RECONNECT_DELAY)
+            self._thread = None
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, events: list):
+        for event in events:
+            if queue.full():
+                # A client that cannot keep up gets a resync instead of an unbounded backlog
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_EVENT)
+                return
+            queue.put_nowait(event)
+
+    def _run(self):
+        connected_before = False
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = connect()
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                if connected_before:
+                    # Notifications sent while we were disconnected are gone
+                    self.publish([RESYNC_EVENT])
+                connected_before = True
+
+                while not self._stop.is_set():
+                    # Short timeout only so close() is noticed; data wakes select immediately
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    events = []
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            events.extend(json.loads(notify.payload))
+                        except ValueError:
+                            print(f"Ignoring malformed {self.channel} payload: {notify.payload[:200]}")
+                    if events:
+                        self.publish(events)
+            except Exception as e:
+                print(f"Event listener error: {e}")
+                self._stop.wait(EVENTS_RECONNECT_DELAY)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+def format_sse(event: dict) -> str:
+    """One Server-Sent Events message, named after the event type"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+# Global instance
+event_bus = EventBus()
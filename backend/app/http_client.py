@@ -0,0 +1,52 @@
+"""
+Shared HTTP client for checks, syncs and upstream APIs
+One requests.Session with a keep-alive connection pool per host, so repeat
+requests to ocean-middleware, cloud-monitoring and the THREDDS servers reuse
+warm connections instead of paying a TCP + TLS handshake every time. Every
+request is timed into the upstream latency metric.
+"""
+import os
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.metrics import observe_upstream
+
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '32'))  # hosts whose pools are kept open
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '16'))  # keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))  # seconds
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))  # seconds, default when the caller passes none
+
+
+class HttpClient:
+    """Thin wrapper over a pooled requests.Session.
+
+    Requests past HTTP_POOL_MAXSIZE concurrent connections to one host still
+    go out, they just are not kept alive afterwards.
+    """
+
+    def __init__(self, pool_hosts: int = HTTP_POOL_HOSTS, pool_maxsize: int = HTTP_POOL_MAXSIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, upstream: str = None, **kwargs) -> requests.Response:
+        """Send a request; upstream names it in the latency metric (default: the host)"""
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        with observe_upstream(upstream or urlsplit(url).hostname or "unknown"):
+            return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+# Global instance
+http_client = HttpClient()
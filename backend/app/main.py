@@ -1,11 +1,16 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import endpoints
 from fastapi.routing import APIRoute
 from pydantic import BaseModel
 from app.db import close_connection_pool
+from app.events import event_bus
+from app.http_client import http_client
+from app.metrics import HTTP_REQUEST_DURATION
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import time
 
 app = FastAPI(
     title="Monitoring API",
@@ -29,10 +34,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Before-Checked-At", "X-Next-Before-Id"],  # /monitoring_logs page cursor
 )
 
 templates = Jinja2Templates(directory="app/templates")
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Per-route latency for /metrics, labelled by route template to keep cardinality bounded"""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.labels(
+        request.method, getattr(route, "path", "unmatched"), response.status_code
+    ).observe(time.perf_counter() - started)
+    return response
+
 app.include_router(endpoints.router, prefix="/service")
 
 @app.on_event("startup")
@@ -43,7 +60,9 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close database connection pool on application shutdown"""
+    """Stop the event listener and close the HTTP and database connection pools on application shutdown"""
+    event_bus.close()
+    http_client.close()
     close_connection_pool()
 
 def extract_pydantic_fields(model_class):
@@ -155,4 +174,9 @@ async def index(request: Request):
 # Health check endpoint for Docker
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "API is running"}
\ No newline at end of file
+    return {"status": "healthy", "message": "API is running"}
+
+# Prometheus scrape endpoint, unauthenticated like /health
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
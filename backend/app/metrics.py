@@ -0,0 +1,61 @@
+"""
+Prometheus metrics for the API and the monitoring daemon
+Each process keeps its own registry: the API serves it on GET /metrics and
+the daemon on MONITOR_METRICS_PORT. Rates (checks per second, results per
+status) come from the counters, e.g.
+rate(monitor_check_duration_seconds_count[5m])
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram
+
+CHECK_DURATION = Histogram(
+    "monitor_check_duration_seconds",
+    "Time to check one service, from dispatch to result",
+    ["type", "protocol"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+CHECK_RESULTS = Counter(
+    "monitor_check_results_total",
+    "Check results recorded, by status",
+    ["status"],
+)
+SCHEDULER_LAG = Histogram(
+    "monitor_scheduler_lag_seconds",
+    "How late due checks were picked up (now minus scheduled time)",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+UPSTREAM_LATENCY = Histogram(
+    "monitor_upstream_request_duration_seconds",
+    "Latency of requests to upstream APIs",
+    ["upstream", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+DB_WRITE_DURATION = Histogram(
+    "monitor_db_write_duration_seconds",
+    "Time to write one batch of check results, including the commit",
+    ["outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "API request latency until the response starts, by route template",
+    ["method", "route", "status"],
+)
+
+
+def observe_check(service: dict, seconds: float):
+    CHECK_DURATION.labels(service.get("type") or "unknown", service.get("protocol") or "unknown").observe(seconds)
+
+
+@contextmanager
+def observe_upstream(upstream: str):
+    """Time a request to an upstream API; outcome is "error" if the block raises"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        UPSTREAM_LATENCY.labels(upstream, outcome).observe(time.perf_counter() - started)
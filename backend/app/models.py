@@ -3,8 +3,30 @@ Database models and schema management
 Automatically creates tables and tracks schema changes on app startup
 """
 from app.db import get_connection
+from datetime import date, datetime
+import os
+import re
+import psycopg2
 import psycopg2.extras
 
+# Native monthly range partitioning of monitoring_logs on checked_at (opt-in)
+MONITORING_LOGS_PARTITIONING = os.getenv('MONITORING_LOGS_PARTITIONING', 'false').lower() == 'true'
+MONITORING_LOGS_PARTITIONS_AHEAD = int(os.getenv('MONITORING_LOGS_PARTITIONS_AHEAD', '3'))  # future months kept created
+MIGRATION_LOCK_TIMEOUT = os.getenv('MIGRATION_LOCK_TIMEOUT', '5s')  # max wait for the lock when swapping tables
+
+# Indexes maintained on monitoring_logs: name -> definition
+MONITORING_LOGS_INDEXES = {
+    'idx_monitoring_logs_service_checked': "(service_id, checked_at DESC)",
+    'idx_monitoring_logs_checked_brin': "USING BRIN (checked_at)",
+    'idx_monitoring_logs_checked_id': "(checked_at DESC, id DESC)",  # keyset pagination of /monitoring_logs
+}
+
+
+def add_months(month: date, n: int) -> date:
+    """First day of the month n months after month"""
+    years, month_index = divmod(month.month - 1 + n, 12)
+    return date(month.year + years, month_index + 1, 1)
+
 
 class DatabaseSchema:
     """Manages database schema creation and migrations"""
@@ -46,6 +68,19 @@ class DatabaseSchema:
         result = cur.fetchone()
         return result['exists'] if isinstance(result, dict) else result[0]
     
+    @staticmethod
+    def is_partitioned(cur, table_name):
+        """Check if a table is a partitioned (parent) table"""
+        cur.execute("""
+            SELECT relkind = 'p' AS partitioned
+            FROM pg_class
+            WHERE oid = to_regclass(%s)
+        """, (f"public.{table_name}",))
+        result = cur.fetchone()
+        if not result:
+            return False
+        return result['partitioned'] if isinstance(result, dict) else result[0]
+    
     @staticmethod
     def create_update_trigger_function(cur):
         """Create the update_updated_at_column function if it doesn't exist"""
@@ -129,12 +164,84 @@ class DatabaseSchema:
             if new_columns:
                 print(f"✓ Added {len(new_columns)} new column(s) to {table_name}")
     
+    @staticmethod
+    def create_monitored_services_name_type_key(cur):
+        """Unique (name, type) used by the sync upserts; skipped while duplicates exist"""
+        cur.execute("""
+            SELECT name, type, count(*) AS copies
+            FROM monitored_services
+            GROUP BY name, type
+            HAVING count(*) > 1
+            ORDER BY copies DESC
+            LIMIT 10
+        """)
+        duplicates = cur.fetchall()
+        if duplicates:
+            listed = ", ".join(f"{row['name']!r}/{row['type']!r} x{row['copies']}" for row in duplicates)
+            print(f"✗ Not creating uq_monitored_services_name_type, duplicate (name, type) pairs: {listed}")
+            print("  Syncs fall back to per-row upserts until the duplicates are removed")
+            return
+        cur.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_monitored_services_name_type
+            ON monitored_services (name, type)
+        """)
+        print(f"✓ Verified unique (name, type) on monitored_services")
+    
+    @staticmethod
+    def create_monitored_services_revision(cur):
+        """Create the revision counter bumped whenever the monitored service set changes"""
+        table_name = 'monitored_services_revision'
+        
+        if not DatabaseSchema.table_exists(cur, table_name):
+            print(f"Creating table: {table_name}")
+            cur.execute("""
+                CREATE TABLE monitored_services_revision (
+                    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                    revision BIGINT NOT NULL DEFAULT 0,
+                    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            print(f"✓ Table {table_name} created successfully")
+        
+        cur.execute("""
+            INSERT INTO monitored_services_revision (id, revision)
+            VALUES (1, 0)
+            ON CONFLICT (id) DO NOTHING
+        """)
+        
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION bump_monitored_services_revision()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                UPDATE monitored_services_revision
+                SET revision = revision + 1, changed_at = CURRENT_TIMESTAMP
+                WHERE id = 1;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+        
+        # Only columns the scheduler cares about; status/counter updates from checks do not bump it
+        cur.execute("""
+            DROP TRIGGER IF EXISTS trg_monitored_services_revision ON monitored_services;
+            CREATE TRIGGER trg_monitored_services_revision
+            AFTER INSERT OR DELETE OR TRUNCATE
+                OR UPDATE OF name, ip_address, port, protocol, interval_type, interval_value, interval_unit, is_active, type
+            ON monitored_services
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_monitored_services_revision()
+        """)
+        print(f"✓ Verified revision trigger on monitored_services")
+    
     @staticmethod
     def create_monitoring_logs_table(cur):
         """Create monitoring_logs table if it doesn't exist"""
         table_name = 'monitoring_logs'
         
-        if not DatabaseSchema.table_exists(cur, table_name):
+        if not DatabaseSchema.table_exists(cur, table_name) and MONITORING_LOGS_PARTITIONING:
+            print(f"Creating partitioned table: {table_name}")
+            DatabaseSchema.create_partitioned_monitoring_logs(cur)
+            print(f"✓ Table {table_name} created successfully")
+        elif not DatabaseSchema.table_exists(cur, table_name):
             print(f"Creating table: {table_name}")
             cur.execute("""
                 CREATE TABLE monitoring_logs (
@@ -181,6 +288,316 @@ class DatabaseSchema:
             if new_columns:
                 print(f"✓ Added {len(new_columns)} new column(s) to {table_name}")
     
+    @staticmethod
+    def create_partitioned_monitoring_logs(cur):
+        """Create monitoring_logs as a table partitioned by month on checked_at, with a default partition.
+        
+        The primary key has to include the partition key, so it is (id, checked_at).
+        """
+        cur.execute("CREATE SEQUENCE IF NOT EXISTS monitoring_logs_id_seq AS INTEGER")
+        cur.execute("""
+            CREATE TABLE monitoring_logs (
+                id INTEGER NOT NULL DEFAULT nextval('monitoring_logs_id_seq'),
+                service_id INTEGER,
+                checked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                status TEXT NOT NULL,
+                message TEXT,
+                notification_sent BOOLEAN DEFAULT false,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                comment TEXT,
+                CONSTRAINT monitoring_logs_pkey PRIMARY KEY (id, checked_at),
+                CONSTRAINT monitoring_logs_service_id_fkey 
+                    FOREIGN KEY (service_id) 
+                    REFERENCES monitored_services(id) 
+                    ON DELETE CASCADE
+            ) PARTITION BY RANGE (checked_at)
+        """)
+        cur.execute("ALTER SEQUENCE monitoring_logs_id_seq OWNED BY monitoring_logs.id")
+        
+        # Row triggers on the parent are cloned onto every partition
+        cur.execute("""
+            DROP TRIGGER IF EXISTS trg_monitoring_logs_updated_at ON monitoring_logs;
+            CREATE TRIGGER trg_monitoring_logs_updated_at 
+            BEFORE UPDATE ON monitoring_logs 
+            FOR EACH ROW EXECUTE FUNCTION update_updated_at_column()
+        """)
+        
+        # Catches rows outside every monthly partition, e.g. if maintenance fell behind
+        cur.execute("CREATE TABLE monitoring_logs_default PARTITION OF monitoring_logs DEFAULT")
+    
+    @staticmethod
+    def get_monitoring_logs_partitions(cur):
+        """List monitoring_logs partitions as (name, lower, upper); None for MINVALUE, the default partition is skipped"""
+        cur.execute("""
+            SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'monitoring_logs'::regclass
+        """)
+        partitions = []
+        for row in cur.fetchall():
+            name, bound = (row['name'], row['bound']) if isinstance(row, dict) else row
+            match = re.search(r"FROM \((.+?)\) TO \((.+?)\)", bound)
+            if not match:
+                continue  # DEFAULT
+            lower, upper = (
+                None if value == 'MINVALUE' else date.fromisoformat(value.strip("'")[:10])
+                for value in match.groups()
+            )
+            partitions.append((name, lower, upper))
+        return sorted(partitions, key=lambda p: p[2])
+    
+    @staticmethod
+    def create_monitoring_logs_partition(cur, month: date):
+        """Create the partition for one month, moving any of its rows out of the default partition"""
+        name = f"monitoring_logs_p{month:%Y%m}"
+        lower, upper = month, add_months(month, 1)
+        
+        cur.execute("SAVEPOINT create_partition")
+        try:
+            cur.execute(f"CREATE TABLE {name} (LIKE monitoring_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            cur.execute(f"""
+                WITH moved AS (
+                    DELETE FROM monitoring_logs_default
+                    WHERE checked_at >= %s AND checked_at < %s
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """, (lower, upper))
+            cur.execute(f"ALTER TABLE monitoring_logs ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (lower, upper))
+            cur.execute("RELEASE SAVEPOINT create_partition")
+            print(f"  Created partition {name}")
+            return True
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT create_partition")
+            print(f"  Could not create partition {name}: {e}")
+            return False
+    
+    @staticmethod
+    def ensure_monitoring_logs_partitions(cur, months_ahead: int = MONITORING_LOGS_PARTITIONS_AHEAD):
+        """Create monthly partitions from the current month through months_ahead; returns the names created"""
+        if not DatabaseSchema.is_partitioned(cur, 'monitoring_logs'):
+            return []
+        
+        covered = [(lower, upper) for _, lower, upper in DatabaseSchema.get_monitoring_logs_partitions(cur)]
+        this_month = date.today().replace(day=1)
+        created = []
+        for n in range(months_ahead + 1):
+            month = add_months(this_month, n)
+            next_month = add_months(month, 1)
+            if any((lower is None or lower < next_month) and month < upper for lower, upper in covered):
+                continue
+            if DatabaseSchema.create_monitoring_logs_partition(cur, month):
+                created.append(f"monitoring_logs_p{month:%Y%m}")
+        return created
+    
+    @staticmethod
+    def maintain_monitoring_logs_partitions():
+        """Keep future monthly partitions created; run periodically by the monitoring daemon"""
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                created = DatabaseSchema.ensure_monitoring_logs_partitions(cur)
+                conn.commit()
+        return created
+    
+    @staticmethod
+    def create_monitoring_logs_indexes():
+        """Create the monitoring_logs indexes outside the schema transaction.
+        
+        On a plain table they are built CONCURRENTLY so writers are not
+        blocked; an index left invalid by an interrupted build is rebuilt.
+        A partitioned parent cannot be indexed concurrently, so it gets a
+        normal CREATE INDEX, which also covers every partition.
+        """
+        with get_connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    partitioned = DatabaseSchema.is_partitioned(cur, 'monitoring_logs')
+                    concurrently = "" if partitioned else "CONCURRENTLY"
+                    for name, definition in MONITORING_LOGS_INDEXES.items():
+                        cur.execute("""
+                            SELECT i.indisvalid
+                            FROM pg_index i
+                            WHERE i.indexrelid = to_regclass(%s)
+                        """, (f"public.{name}",))
+                        row = cur.fetchone()
+                        if row and row[0]:
+                            continue
+                        if row:
+                            print(f"  Rebuilding invalid index: {name}")
+                            cur.execute(f"DROP INDEX {concurrently} IF EXISTS {name}")
+                        print(f"  Creating index: {name}")
+                        cur.execute(f"CREATE INDEX {concurrently} IF NOT EXISTS {name} ON monitoring_logs {definition}")
+                print("✓ Verified indexes on monitoring_logs")
+            finally:
+                conn.autocommit = False
+    
+    @staticmethod
+    def migrate_monitoring_logs_to_partitioned():
+        """Convert an existing monitoring_logs table into a partitioned one without rewriting it.
+        
+        The existing table becomes the partition for everything before next
+        month. The slow steps (validating constraints, building the unique
+        index the partitioned primary key needs) run without blocking writes;
+        only the final rename/attach takes a short exclusive lock.
+        """
+        # A timestamp rather than a date, so the CHECK below provably implies the partition bound
+        cutover = datetime.combine(add_months(date.today().replace(day=1), 1), datetime.min.time())
+        print(f"Migrating monitoring_logs to monthly partitions (existing rows kept before {cutover:%Y-%m-%d})...")
+        
+        # Built concurrently now so the attach below adopts them instead of building under the lock
+        DatabaseSchema.create_monitoring_logs_indexes()
+        
+        with get_connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("UPDATE monitoring_logs SET checked_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE checked_at IS NULL")
+                    
+                    # A validated CHECK lets SET NOT NULL and ATTACH PARTITION skip their full-table scans
+                    cur.execute("ALTER TABLE monitoring_logs DROP CONSTRAINT IF EXISTS monitoring_logs_legacy_bounds")
+                    cur.execute(f"""
+                        ALTER TABLE monitoring_logs ADD CONSTRAINT monitoring_logs_legacy_bounds
+                        CHECK (checked_at IS NOT NULL AND checked_at < %s) NOT VALID
+                    """, (cutover,))
+                    cur.execute("ALTER TABLE monitoring_logs VALIDATE CONSTRAINT monitoring_logs_legacy_bounds")
+                    
+                    cur.execute("DROP INDEX CONCURRENTLY IF EXISTS monitoring_logs_legacy_id_checked_at")
+                    cur.execute("CREATE UNIQUE INDEX CONCURRENTLY monitoring_logs_legacy_id_checked_at ON monitoring_logs (id, checked_at)")
+                
+                conn.autocommit = False
+                with conn.cursor() as cur:
+                    cur.execute("SET LOCAL lock_timeout = %s", (MIGRATION_LOCK_TIMEOUT,))
+                    cur.execute("ALTER TABLE monitoring_logs RENAME TO monitoring_logs_legacy")
+                    cur.execute("ALTER TABLE monitoring_logs_legacy RENAME CONSTRAINT monitoring_logs_pkey TO monitoring_logs_legacy_pkey")
+                    for name in MONITORING_LOGS_INDEXES:
+                        cur.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name.replace('monitoring_logs', 'monitoring_logs_legacy')}")
+                    cur.execute("DROP TRIGGER IF EXISTS trg_monitoring_logs_updated_at ON monitoring_logs_legacy")
+                    cur.execute("ALTER TABLE monitoring_logs_legacy ALTER COLUMN checked_at SET NOT NULL")
+                    
+                    DatabaseSchema.create_partitioned_monitoring_logs(cur)
+                    for name, definition in MONITORING_LOGS_INDEXES.items():
+                        cur.execute(f"CREATE INDEX {name} ON monitoring_logs {definition}")
+                    
+                    # Matching indexes and the foreign key on the old table are adopted rather than rebuilt
+                    cur.execute("""
+                        ALTER TABLE monitoring_logs ATTACH PARTITION monitoring_logs_legacy
+                        FOR VALUES FROM (MINVALUE) TO (%s)
+                    """, (cutover,))
+                    cur.execute("ALTER TABLE monitoring_logs_legacy DROP CONSTRAINT monitoring_logs_legacy_bounds")
+                    DatabaseSchema.ensure_monitoring_logs_partitions(cur)
+                conn.commit()
+                print("✓ monitoring_logs is now partitioned by month")
+            except Exception:
+                conn.rollback()
+                # The bounds check would start rejecting inserts at the cutover, so never leave it behind
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute("ALTER TABLE monitoring_logs DROP CONSTRAINT IF EXISTS monitoring_logs_legacy_bounds")
+                raise
+            finally:
+                conn.autocommit = False
+    
+    @staticmethod
+    def create_monitoring_rollups_tables(cur):
+        """Create the hourly and daily per-service rollups of check results.
+        
+        They are maintained incrementally by results.write_results; a new table
+        is backfilled once from monitoring_logs (without latency, which the
+        logs do not record).
+        """
+        for table_name, bucket in (('monitoring_rollups_hourly', 'hour'), ('monitoring_rollups_daily', 'day')):
+            if DatabaseSchema.table_exists(cur, table_name):
+                continue
+            print(f"Creating table: {table_name}")
+            cur.execute(f"""
+                CREATE TABLE {table_name} (
+                    service_id INTEGER NOT NULL,
+                    bucket_start TIMESTAMP NOT NULL,
+                    checks INTEGER NOT NULL DEFAULT 0,
+                    up_count INTEGER NOT NULL DEFAULT 0,
+                    down_count INTEGER NOT NULL DEFAULT 0,
+                    degraded_count INTEGER NOT NULL DEFAULT 0,
+                    latency_count INTEGER NOT NULL DEFAULT 0,
+                    latency_sum_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+                    latency_min_ms DOUBLE PRECISION,
+                    latency_max_ms DOUBLE PRECISION,
+                    PRIMARY KEY (service_id, bucket_start),
+                    CONSTRAINT {table_name}_service_id_fkey 
+                        FOREIGN KEY (service_id) 
+                        REFERENCES monitored_services(id) 
+                        ON DELETE CASCADE
+                )
+            """)
+            cur.execute(f"""
+                INSERT INTO {table_name} (service_id, bucket_start, checks, up_count, down_count, degraded_count)
+                SELECT
+                    service_id,
+                    date_trunc('{bucket}', checked_at),
+                    COUNT(*),
+                    COUNT(*) FILTER (WHERE status = 'up'),
+                    COUNT(*) FILTER (WHERE status = 'down'),
+                    COUNT(*) FILTER (WHERE status = 'degraded')
+                FROM monitoring_logs
+                WHERE service_id IS NOT NULL AND checked_at IS NOT NULL
+                GROUP BY 1, 2
+            """)
+            print(f"✓ Table {table_name} created and backfilled with {cur.rowcount} bucket(s)")
+    
+    @staticmethod
+    def create_thredds_capabilities_tables(cur):
+        """Create the per-service GetCapabilities state and its change log (see app.thredds)"""
+        if not DatabaseSchema.table_exists(cur, 'thredds_capabilities'):
+            print("Creating table: thredds_capabilities")
+            cur.execute("""
+                CREATE TABLE thredds_capabilities (
+                    service_id INTEGER PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT,
+                    layers TEXT[] NOT NULL DEFAULT '{}',
+                    bytes BIGINT,
+                    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    hashed_at TIMESTAMP,
+                    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT thredds_capabilities_service_id_fkey 
+                        FOREIGN KEY (service_id) 
+                        REFERENCES monitored_services(id) 
+                        ON DELETE CASCADE
+                )
+            """)
+            print("✓ Table thredds_capabilities created successfully")
+        else:
+            # Validators are also kept for documents too large to hash
+            cur.execute("ALTER TABLE thredds_capabilities ALTER COLUMN content_hash DROP NOT NULL")
+            cur.execute("ALTER TABLE thredds_capabilities ADD COLUMN IF NOT EXISTS hashed_at TIMESTAMP")
+        
+        if not DatabaseSchema.table_exists(cur, 'thredds_capability_changes'):
+            print("Creating table: thredds_capability_changes")
+            cur.execute("""
+                CREATE TABLE thredds_capability_changes (
+                    id SERIAL PRIMARY KEY,
+                    service_id INTEGER NOT NULL,
+                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    previous_hash TEXT,
+                    content_hash TEXT NOT NULL,
+                    layers_added INTEGER NOT NULL DEFAULT 0,
+                    layers_removed INTEGER NOT NULL DEFAULT 0,
+                    added TEXT[] NOT NULL DEFAULT '{}',
+                    removed TEXT[] NOT NULL DEFAULT '{}',
+                    CONSTRAINT thredds_capability_changes_service_id_fkey 
+                        FOREIGN KEY (service_id) 
+                        REFERENCES monitored_services(id) 
+                        ON DELETE CASCADE
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX idx_thredds_capability_changes_service_detected
+                ON thredds_capability_changes (service_id, detected_at DESC)
+            """)
+            print("✓ Table thredds_capability_changes created successfully")
+    
     @staticmethod
     def create_dashboard_configs_table(cur):
         """Create dashboard_configs table if it doesn't exist"""
@@ -239,13 +656,30 @@ class DatabaseSchema:
                     
                     # Create/update tables in order (respecting foreign keys)
                     DatabaseSchema.create_monitored_services_table(cur)
+                    DatabaseSchema.create_monitored_services_name_type_key(cur)
+                    DatabaseSchema.create_monitored_services_revision(cur)
                     DatabaseSchema.create_monitoring_logs_table(cur)
+                    DatabaseSchema.create_monitoring_rollups_tables(cur)
+                    DatabaseSchema.create_thredds_capabilities_tables(cur)
                     DatabaseSchema.create_dashboard_configs_table(cur)
                     
+                    # No-op unless monitoring_logs is partitioned
+                    DatabaseSchema.ensure_monitoring_logs_partitions(cur)
+                    partitioned = DatabaseSchema.is_partitioned(cur, 'monitoring_logs')
+                    
                     conn.commit()
-                    print("="*60)
-                    print("✓ Database schema initialization complete")
-                    print("="*60 + "\n")
+            
+            # Steps that must run outside the schema transaction
+            if MONITORING_LOGS_PARTITIONING and not partitioned:
+                try:
+                    DatabaseSchema.migrate_monitoring_logs_to_partitioned()
+                except Exception as e:
+                    print(f"✗ Error partitioning monitoring_logs, keeping the existing table: {e}")
+            DatabaseSchema.create_monitoring_logs_indexes()
+            
+            print("="*60)
+            print("✓ Database schema initialization complete")
+            print("="*60 + "\n")
         except Exception as e:
             print(f"✗ Error initializing database: {e}")
             raise
@@ -8,6 +8,8 @@ import requests
 import json
 from datetime import datetime, timedelta
 
+from app.service_sync import reconcile_ocean_tasks
+
 # Configure logging
 # logging.basicConfig(
 #     level=logging.INFO,
@@ -87,79 +89,28 @@ def get_task_json():
 def check_tasks_in_monitoring_table(tasks_json):
     """
     Check which tasks are already in monitored_services.
-
+    Missing ones are inserted by the shared reconcile_ocean_tasks.
     """
     if not tasks_json:
         return []
         
-    task_names = [f"{task['id']}: {task['short_name']}" for task in tasks_json]
+    tasks = [
+        {
+            "name": f"{task['id']}: {task['short_name']}",
+            "when": task.get('when', '').lower(),
+            "final_status": task.get('final_status', 'unknown'),
+            "final_comments": task.get('final_comments', ''),
+        }
+        for task in tasks_json
+    ]
 
     try:
         connection = psycopg2.connect(**DB_CONFIG)
         cursor = connection.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
-        # Fetch existing task names
-        cursor.execute("SELECT name FROM monitored_services WHERE name IN %s", (tuple(task_names),))
-        existing_tasks = [row["name"] for row in cursor.fetchall()]
-
-        # Insert missing tasks
-        for task in tasks_json:
-            name = f"{task['id']}: {task['short_name']}"
-            if name not in existing_tasks:
-                when = task.get('when', '').lower()
-                final_status = task.get('final_status', 'unknown')
-                final_comments = task.get('final_comments', '')
-
-                if when == 'daily':
-                    check_interval_sec = 1
-                    interval_type = 'daily'
-                    interval_value = 1
-                    interval_unit = 'days'
-                elif when == 'monthly':
-                    check_interval_sec = 60
-                    interval_type = 'specific_day'
-                    interval_value = 4
-                    interval_unit = 'months'
-                else:
-                    print(f"Skipping unknown frequency: {when}")
-                    continue
-
-                insert_query = """
-                               INSERT INTO public.monitored_services
-                               (id, "name", ip_address, port, protocol, check_interval_sec, interval_type,
-                                interval_value, interval_unit, cron_expression, cron_job_name, last_status,
-                                success_count, failure_count, created_at, updated_at, "comment", is_active)
-                               VALUES (nextval('monitored_services_id_seq'::regclass), 
-                                       %s, 
-                                       %s, 
-                                       %s, 
-                                       %s, 
-                                       %s, 
-                                       %s, 
-                                       %s, 
-                                       %s, 
-                                       '', '', 
-                                       %s, 
-                                       0, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 
-                                       %s, 
-                                       true) 
-                               """
-
-                values = (
-                    name,
-                    'ocean-middleware.spc.int/middleware/api/',
-                    80,
-                    'http',
-                    check_interval_sec,
-                    interval_type,
-                    interval_value,
-                    interval_unit,
-                    final_status,
-                    final_comments
-                )
-
-                cursor.execute(insert_query, values)
-                print(f"Inserted: {name}")
+        inserted, existing_tasks = reconcile_ocean_tasks(cursor, tasks)
+        for name in inserted:
+            print(f"Inserted: {name}")
 
         connection.commit()
         return existing_tasks
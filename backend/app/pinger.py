@@ -0,0 +1,247 @@
+"""
+Batched ICMP pinger for the ping protocol
+Sends echo requests to every target from one socket and matches replies by
+sequence number, so a batch costs one ping timeout instead of one per target
+"""
+import os
+import re
+import select
+import socket
+import struct
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PING_COUNT = int(os.getenv('PING_COUNT', '2'))  # echo requests per target
+PING_INTERVAL = float(os.getenv('PING_INTERVAL', '0.5'))  # seconds between rounds
+PING_TIMEOUT = float(os.getenv('PING_TIMEOUT', '2'))  # seconds to wait after the last request
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+
+def icmp_checksum(data: bytes) -> int:
+    """Internet checksum of an ICMP message"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def summarize(host: str, sent: int, rtts: list) -> dict:
+    """Build a ping result with packet loss and RTT statistics"""
+    received = len(rtts)
+    loss = 100.0 * (sent - received) / sent if sent else 100.0
+    output = f"{sent} packets transmitted, {received} received, {loss:.0f}% packet loss"
+    latency_ms = None
+    if rtts:
+        latency_ms = sum(rtts) / received
+        output += f", rtt min/avg/max = {min(rtts):.3f}/{latency_ms:.3f}/{max(rtts):.3f} ms"
+    return {
+        "status": "up" if received else "down",
+        "output": output,
+        "command": f"ICMP echo {host} x{sent}",
+        "latency_ms": latency_ms,
+        "packet_loss": loss,
+    }
+
+
+class IcmpPinger:
+    """Pings many hosts at once.
+
+    Prefers unprivileged datagram ICMP sockets (net.ipv4.ping_group_range),
+    then raw sockets (CAP_NET_RAW), and finally falls back to running the
+    system ping for all targets in parallel.
+    """
+
+    def __init__(self):
+        self._modes = {}  # address family -> socket type that worked, or None
+        self._seq_lock = threading.Lock()
+        self._seq = 0
+        self._ident = os.getpid() & 0xFFFF
+
+    def ping_many(self, hosts, count: int = PING_COUNT, timeout: float = PING_TIMEOUT, retries: int = 1) -> dict:
+        """Ping every host and return {host: result}.
+
+        Hosts that are down are re-pinged as a batch up to ``retries`` times.
+        """
+        hosts = list(dict.fromkeys(hosts))
+        results = {}
+        pending = hosts
+        for attempt in range(max(retries, 1)):
+            batch = self._ping_batch(pending, count, timeout)
+            results.update(batch)
+            pending = [host for host in pending if batch[host]["status"] != "up"]
+            if not pending:
+                break
+        return results
+
+    def _ping_batch(self, hosts, count, timeout):
+        if not hosts:
+            return {}
+
+        results = {}
+        addresses = self._resolve(hosts)
+        by_family = {}
+        for host in hosts:
+            address = addresses.get(host)
+            if address is None:
+                results[host] = {
+                    "status": "down",
+                    "output": f"ping: {host}: Name or service not known",
+                    "command": f"ICMP echo {host} x{count}",
+                    "latency_ms": None,
+                    "packet_loss": 100.0,
+                }
+                continue
+            by_family.setdefault(address[0], []).append(host)
+
+        for family, family_hosts in by_family.items():
+            sock = self._open_socket(family)
+            if sock is None:
+                results.update(self._ping_subprocess(family_hosts, count, timeout))
+                continue
+            try:
+                results.update(self._ping_socket(sock, family, family_hosts, addresses, count, timeout))
+            finally:
+                sock.close()
+        return results
+
+    def _resolve(self, hosts):
+        """Resolve hosts to (family, address) concurrently"""
+        def resolve(host):
+            try:
+                info = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+                return host, (info[0][0], info[0][4][0])
+            except (socket.gaierror, IndexError, UnicodeError):
+                return host, None
+
+        with ThreadPoolExecutor(max_workers=min(16, len(hosts))) as pool:
+            return dict(pool.map(resolve, hosts))
+
+    def _open_socket(self, family):
+        """Open an ICMP socket for the family, remembering which kind works"""
+        proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+        modes = [self._modes[family]] if family in self._modes else [socket.SOCK_DGRAM, socket.SOCK_RAW]
+        for sock_type in modes:
+            if sock_type is None:
+                break
+            try:
+                sock = socket.socket(family, sock_type, proto)
+                sock.setblocking(False)
+                self._modes[family] = sock_type
+                return sock
+            except OSError:
+                continue
+        self._modes[family] = None
+        return None
+
+    def _next_seqs(self, n):
+        with self._seq_lock:
+            start = self._seq
+            self._seq = (start + n) % 0x10000
+        return [(start + i) % 0x10000 for i in range(n)]
+
+    def _ping_socket(self, sock, family, hosts, addresses, count, timeout):
+        is_v4 = family == socket.AF_INET
+        is_raw = sock.type == socket.SOCK_RAW
+        request_type = ICMP_ECHO_REQUEST if is_v4 else ICMPV6_ECHO_REQUEST
+        reply_type = ICMP_ECHO_REPLY if is_v4 else ICMPV6_ECHO_REPLY
+
+        seqs = self._next_seqs(len(hosts) * count)
+        outstanding = {}  # seq -> (host, sent_at)
+        rtts = {host: [] for host in hosts}
+        sent = {host: 0 for host in hosts}
+
+        def receive_until(deadline):
+            while outstanding:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if not readable:
+                    return
+                try:
+                    data, source = sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                received_at = time.monotonic()
+                if is_v4 and is_raw:
+                    data = data[(data[0] & 0x0F) * 4:]  # strip the IP header
+                if len(data) < 8:
+                    continue
+                icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", data[:8])
+                # Datagram sockets get their id rewritten by the kernel and only see their own replies
+                if icmp_type != reply_type or (is_raw and ident != self._ident):
+                    continue
+                entry = outstanding.get(seq)
+                if entry is None or addresses[entry[0]][1] != source[0]:
+                    continue
+                del outstanding[seq]
+                rtts[entry[0]].append((received_at - entry[1]) * 1000)
+
+        for round_number in range(count):
+            for index, host in enumerate(hosts):
+                seq = seqs[round_number * len(hosts) + index]
+                header = struct.pack("!BBHHH", request_type, 0, 0, self._ident, seq)
+                payload = struct.pack("!d", time.time())
+                checksum = icmp_checksum(header + payload) if is_v4 else 0
+                packet = struct.pack("!BBHHH", request_type, 0, checksum, self._ident, seq) + payload
+                try:
+                    sock.sendto(packet, (addresses[host][1], 0))
+                    outstanding[seq] = (host, time.monotonic())
+                    sent[host] += 1
+                except OSError:
+                    sent[host] += 1  # counts as lost, like ping does
+            if round_number < count - 1:
+                receive_until(time.monotonic() + PING_INTERVAL)
+        receive_until(time.monotonic() + timeout)
+
+        return {host: summarize(host, sent[host], rtts[host]) for host in hosts}
+
+    def _ping_subprocess(self, hosts, count, timeout):
+        """Fallback: run the system ping for every host at once and parse the summaries"""
+        processes = {}
+        for host in hosts:
+            command = ["ping", "-c", str(count), "-W", str(max(int(timeout), 1)), host]
+            try:
+                processes[host] = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            except OSError as e:
+                processes[host] = e
+
+        results = {}
+        wait_seconds = count * PING_INTERVAL + timeout + 5
+        for host, process in processes.items():
+            if isinstance(process, OSError):
+                results[host] = summarize(host, count, [])
+                results[host]["output"] = str(process)
+                continue
+            try:
+                stdout, stderr = process.communicate(timeout=wait_seconds)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                stdout, stderr = process.communicate()
+            received = re.search(r"(\d+) packets transmitted, (\d+) (?:packets )?received.*", stdout or "")
+            rtt = re.search(r"rtt .*= [\d.]+/([\d.]+)/.*", stdout or "")
+            results[host] = summarize(host, count, [])
+            if received:
+                sent_count, received_count = int(received.group(1)), int(received.group(2))
+                results[host].update({
+                    "status": "up" if received_count else "down",
+                    "output": "\n".join(match.group(0) for match in (received, rtt) if match),
+                    "latency_ms": float(rtt.group(1)) if rtt else None,
+                    "packet_loss": 100.0 * (sent_count - received_count) / sent_count if sent_count else 100.0,
+                })
+            else:
+                results[host]["output"] = (stderr or stdout or "Ping failed").strip()
+            results[host]["command"] = f"ping -c {count} {host}"
+        return results
+
+
+# Global instance
+pinger = IcmpPinger()
@@ -0,0 +1,215 @@
+"""
+In-process probe engine for tcp, http and https checks
+Runs probes on a single asyncio loop in a background thread instead of
+spawning curl/nc for every attempt
+"""
+import asyncio
+import os
+import ssl
+import threading
+import time
+from concurrent.futures import Future
+
+PROBE_TIMEOUT = float(os.getenv('PROBE_TIMEOUT', '10'))  # seconds per attempt
+PROBE_MAX_CONCURRENCY = int(os.getenv('PROBE_MAX_CONCURRENCY', '1000'))
+PROBE_VERIFY_TLS = os.getenv('PROBE_VERIFY_TLS', 'true').lower() == 'true'
+PROBE_POOL_SIZE = int(os.getenv('PROBE_POOL_SIZE', '4'))  # idle keep-alive connections per host
+PROBE_POOL_IDLE = float(os.getenv('PROBE_POOL_IDLE', '30'))  # seconds an idle connection is kept
+
+PROBE_PROTOCOLS = ('tcp', 'http', 'https')
+MAX_HEADER_BYTES = 64 * 1024
+
+
+def build_url(protocol: str, host: str, port) -> str:
+    """Build the probe URL, omitting the port when it is the scheme default"""
+    default_port = 443 if protocol == 'https' else 80
+    url = f"{protocol}://{format_host(host)}"
+    if port and str(port).isdigit() and int(port) not in (0, default_port):
+        url += f":{port}"
+    return url
+
+
+def format_host(host: str) -> str:
+    """Wrap IPv6 literals in brackets for use in URLs and Host headers"""
+    return f"[{host}]" if ':' in host and not host.startswith('[') else host
+
+
+class ProbeEngine:
+    """Runs tcp/http/https probes concurrently on an asyncio loop"""
+
+    def __init__(self, timeout: float = PROBE_TIMEOUT, max_concurrency: int = PROBE_MAX_CONCURRENCY):
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+        self._idle = {}  # (scheme, host, port) -> [(reader, writer, released_at)]
+        self._ssl_context = ssl.create_default_context()
+        if not PROBE_VERIFY_TLS:
+            self._ssl_context.check_hostname = False
+            self._ssl_context.verify_mode = ssl.CERT_NONE
+
+    def _ensure_started(self):
+        """Start the event loop thread on first use"""
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="probe-engine", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+
+    def submit(self, protocol: str, host: str, port, retries: int = 3, retry_delay: float = 1) -> Future:
+        """Schedule a probe and return a Future resolving to a result dict.
+
+        The result has status ('up'/'down'), output, command and latency_ms.
+        """
+        self._ensure_started()
+        coro = self._probe(protocol, host, port, retries, retry_delay)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def probe(self, protocol: str, host: str, port, retries: int = 3, retry_delay: float = 1) -> dict:
+        """Run a probe and block until it finishes"""
+        return self.submit(protocol, host, port, retries, retry_delay).result()
+
+    def close(self):
+        """Close pooled connections and stop the loop thread"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_idle(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    async def _probe(self, protocol, host, port, retries, retry_delay):
+        if protocol == 'tcp':
+            command = f"TCP connect {host}:{port}"
+        else:
+            command = f"HEAD {build_url(protocol, host, port)}"
+
+        output = ""
+        async with self._semaphore:
+            for attempt in range(retries):
+                started = time.monotonic()
+                try:
+                    if protocol == 'tcp':
+                        output = await asyncio.wait_for(self._tcp(host, port), self.timeout)
+                    else:
+                        output = await asyncio.wait_for(self._http(protocol, host, port), self.timeout)
+                    latency_ms = (time.monotonic() - started) * 1000
+                    return {"status": "up", "output": output, "command": command, "latency_ms": latency_ms}
+                except asyncio.TimeoutError:
+                    output = "Timeout occurred"
+                except Exception as e:
+                    output = str(e) or e.__class__.__name__
+                if attempt < retries - 1:
+                    await asyncio.sleep(retry_delay)
+
+        return {"status": "down", "output": output, "command": command, "latency_ms": None}
+
+    async def _tcp(self, host, port):
+        if not port or not str(port).isdigit():
+            raise ValueError(f"Invalid port: {port}")
+        reader, writer = await asyncio.open_connection(host, int(port))
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except OSError:
+            pass
+        finally:
+            # Also reached when wait_for cancels us during wait_closed
+            writer.close()
+        return f"Connection to {host} {port} port [tcp] succeeded!"
+
+    async def _http(self, scheme, host, port):
+        default_port = 443 if scheme == 'https' else 80
+        port = int(port) if port and str(port).isdigit() and int(port) != 0 else default_port
+        key = (scheme, host, port)
+
+        connection = self._acquire(key)
+        if connection:
+            try:
+                return await self._head(key, *connection)
+            except (OSError, ValueError, asyncio.IncompleteReadError):
+                # The server dropped the idle connection (_head closed it); retry on a fresh one
+                pass
+
+        if scheme == 'https':
+            reader, writer = await asyncio.open_connection(host, port, ssl=self._ssl_context, server_hostname=host)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return await self._head(key, reader, writer)
+
+    async def _head(self, key, reader, writer):
+        scheme, host, port = key
+        host_header = format_host(host)
+        if port != (443 if scheme == 'https' else 80):
+            host_header += f":{port}"
+        request = (
+            f"HEAD / HTTP/1.1\r\n"
+            f"Host: {host_header}\r\n"
+            f"User-Agent: gem-monitoring-probe\r\n"
+            f"Accept: */*\r\n"
+            f"\r\n"
+        )
+        try:
+            writer.write(request.encode('ascii'))
+            await writer.drain()
+
+            head = await reader.readuntil(b"\r\n\r\n")
+            if len(head) > MAX_HEADER_BYTES:
+                raise ValueError("Response headers too large")
+            text = head.decode('iso-8859-1')
+            status_line = text.split("\r\n", 1)[0]
+            if not status_line.startswith("HTTP/"):
+                raise ValueError(f"Invalid HTTP response: {status_line[:100]}")
+        except BaseException:
+            # Errors and wait_for cancellation alike: never leave the socket open
+            writer.close()
+            raise
+
+        headers = text.lower()
+        if status_line.startswith("HTTP/1.0") or "\r\nconnection: close" in headers:
+            writer.close()
+        else:
+            self._release(key, reader, writer)
+        return text.replace("\r\n", "\n").strip()
+
+    def _acquire(self, key):
+        """Take a live idle connection for this host, if any"""
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        while idle:
+            reader, writer, released_at = idle.pop()
+            if now - released_at <= PROBE_POOL_IDLE and not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        return None
+
+    def _release(self, key, reader, writer):
+        """Return a connection to the idle pool, closing it if the pool is full"""
+        idle = self._idle.setdefault(key, [])
+        if len(idle) >= PROBE_POOL_SIZE:
+            writer.close()
+            return
+        idle.append((reader, writer, time.monotonic()))
+
+    async def _close_idle(self):
+        for idle in self._idle.values():
+            for _, writer, _ in idle:
+                writer.close()
+        self._idle.clear()
+
+
+# Global instance
+probe_engine = ProbeEngine()
@@ -0,0 +1,149 @@
+"""
+Write-behind sink for check results
+Buffers results and writes them in batches through results.write_results,
+flushing when the buffer reaches RESULT_SINK_BATCH_SIZE or every
+RESULT_SINK_FLUSH_INTERVAL seconds, so a batch costs one commit instead of
+two per check
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from app.db import get_connection
+from app.metrics import CHECK_RESULTS, DB_WRITE_DURATION
+from app.results import write_results
+
+RESULT_SINK_BATCH_SIZE = int(os.getenv('RESULT_SINK_BATCH_SIZE', '500'))  # results per flush
+RESULT_SINK_FLUSH_INTERVAL = float(os.getenv('RESULT_SINK_FLUSH_INTERVAL', '2'))  # seconds
+RESULT_SINK_MAX_PENDING = int(os.getenv('RESULT_SINK_MAX_PENDING', '10000'))  # buffered results before producers wait
+RESULT_SINK_FULL_WAIT = float(os.getenv('RESULT_SINK_FULL_WAIT', '10'))  # seconds a producer waits before dropping the oldest
+
+
+class ResultSink:
+    """Buffered writer for check results.
+
+    Until start() is called (e.g. in the API process) results are written
+    immediately, so callers never need to know whether a sink is running.
+    A failed immediate write raises; only the buffered path keeps failed
+    batches for a retry.
+    """
+
+    def __init__(self, batch_size: int = RESULT_SINK_BATCH_SIZE, flush_interval: float = RESULT_SINK_FLUSH_INTERVAL,
+                 max_pending: int = RESULT_SINK_MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, batch_size)
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one batch in flight at a time
+        self._thread = None
+        self._running = False
+        self.dropped = 0
+
+    def start(self):
+        """Start the background flusher"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+        self._thread.start()
+
+    def submit(self, result: dict):
+        self.submit_many([result])
+
+    def submit_many(self, results: list):
+        """Queue results for the next flush, or write them now if the sink is not running"""
+        if not results:
+            return
+        for result in results:
+            CHECK_RESULTS.labels(result["status"]).inc()
+        if not self._running:
+            self._write(list(results), raise_errors=True)
+            return
+
+        with self._cond:
+            deadline = time.monotonic() + RESULT_SINK_FULL_WAIT
+            while len(self._buffer) + len(results) > self.max_pending and self._running:
+                self._cond.notify_all()  # wake the flusher
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    overflow = len(self._buffer) + len(results) - self.max_pending
+                    for _ in range(min(overflow, len(self._buffer))):
+                        self._buffer.popleft()
+                    self.dropped += overflow
+                    print(f"Result sink full, dropped {overflow} oldest result(s)")
+                    break
+                self._cond.wait(remaining)
+            self._buffer.extend(results)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self) -> bool:
+        """Write everything buffered so far; False if a batch failed and was requeued"""
+        while True:
+            with self._cond:
+                if not self._buffer:
+                    return True
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._cond.notify_all()  # room for waiting producers
+            if not self._write(batch):
+                self._requeue(batch)
+                return False
+
+    def close(self):
+        """Stop the flusher and write whatever is still buffered"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._buffer)
+
+    def _run(self):
+        healthy = True
+        while True:
+            with self._cond:
+                # After a failed write, back off for a full interval even if the buffer is full
+                if self._running and (not healthy or len(self._buffer) < self.batch_size):
+                    self._cond.wait(self.flush_interval)
+                if not self._running:
+                    return
+            healthy = self.flush()
+
+    def _write(self, batch: list, raise_errors: bool = False) -> bool:
+        with self._flush_lock:
+            started = time.perf_counter()
+            try:
+                with get_connection() as conn:
+                    with conn.cursor() as cur:
+                        write_results(cur, batch)
+                        conn.commit()
+                DB_WRITE_DURATION.labels("ok").observe(time.perf_counter() - started)
+                return True
+            except Exception as e:
+                DB_WRITE_DURATION.labels("error").observe(time.perf_counter() - started)
+                print(f"Error writing {len(batch)} check result(s): {e}")
+                if raise_errors:
+                    raise
+                return False
+
+    def _requeue(self, batch: list):
+        """Put a failed batch back in front for the next flush, keeping the buffer bounded"""
+        with self._cond:
+            room = self.max_pending - len(self._buffer)
+            if room < len(batch):
+                self.dropped += len(batch) - room
+                print(f"Result sink full, dropped {len(batch) - room} result(s) from a failed flush")
+                batch = batch[len(batch) - room:] if room > 0 else []
+            self._buffer.extendleft(reversed(batch))
+
+
+# Global instance
+result_sink = ResultSink()
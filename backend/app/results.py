@@ -0,0 +1,184 @@
+"""
+Batched writes of check results
+Turns a list of check results into one multi-row monitoring_logs insert, one
+UPDATE ... FROM (VALUES ...) on monitored_services and upserts into the
+hourly/daily uptime rollups, then announces the new logs and status
+transitions on MONITORING_EVENTS_CHANNEL (delivered when the caller commits)
+"""
+import json
+import os
+from datetime import datetime
+
+import psycopg2.extras
+
+MONITORING_EVENTS_CHANNEL = os.getenv('MONITORING_EVENTS_CHANNEL', 'monitoring_events')  # LISTEN/NOTIFY channel
+MONITORING_EVENTS_PER_NOTIFY = 50  # keeps each payload well under the 8000 byte NOTIFY limit
+
+
+def format_log_message(command: str, message: str) -> str:
+    return f"Command: {command}\nResult: {message[:450]}"
+
+
+def make_result(service_id: int, status: str, output: str, command: str, **fields) -> dict:
+    """Build a check result.
+
+    Optional fields: success_count/failure_count (absolute values from an
+    upstream instead of incrementing), updated_at (upstream timestamp instead
+    of NOW()), comment, latency_ms, log_only (write the log row but leave
+    the service status alone). checked_at defaults to now, so results that
+    wait in the sink (e.g. through a database outage) keep their check time.
+    """
+    fields.setdefault("checked_at", datetime.now())
+    return dict(fields, service_id=service_id, status=status, output=output, command=command)
+
+
+def aggregate_status_updates(results: list) -> list:
+    """Collapse results into one status update row per service, latest result last"""
+    updates = {}
+    for result in results:
+        if result.get("log_only"):
+            continue
+        success = result["status"] == "up"
+        row = updates.get(result["service_id"])
+        if row is None:
+            row = updates[result["service_id"]] = {
+                "status": None, "success_inc": 0, "failure_inc": 0,
+                "success_count": None, "failure_count": None, "updated_at": None, "comment": None,
+            }
+        row["status"] = result["status"]
+        row["success_inc"] += 1 if success else 0
+        row["failure_inc"] += 0 if success else 1
+        for field in ("success_count", "failure_count", "updated_at", "comment"):
+            if result.get(field) is not None:
+                row[field] = result[field]
+    return [
+        (service_id, row["status"], row["success_inc"], row["failure_inc"],
+         row["success_count"], row["failure_count"], row["updated_at"], row["comment"])
+        for service_id, row in sorted(updates.items())
+    ]
+
+
+def bucket_start(checked_at: datetime, bucket: str) -> datetime:
+    """Start of the 'hour' or 'day' containing checked_at, like date_trunc"""
+    if bucket == "day":
+        return checked_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return checked_at.replace(minute=0, second=0, microsecond=0)
+
+
+def aggregate_rollups(results: list, bucket: str = "hour") -> list:
+    """Collapse results into one rollup increment row per service and bucket of their check time"""
+    rollups = {}
+    for result in results:
+        if result.get("log_only"):
+            continue
+        key = (result["service_id"], bucket_start(result["checked_at"], bucket))
+        row = rollups.get(key)
+        if row is None:
+            row = rollups[key] = {
+                "checks": 0, "up": 0, "down": 0, "degraded": 0,
+                "latency_count": 0, "latency_sum": 0.0, "latency_min": None, "latency_max": None,
+            }
+        row["checks"] += 1
+        if result["status"] in ("up", "down", "degraded"):
+            row[result["status"]] += 1
+        latency = result.get("latency_ms")
+        if latency is not None:
+            row["latency_count"] += 1
+            row["latency_sum"] += latency
+            row["latency_min"] = latency if row["latency_min"] is None else min(row["latency_min"], latency)
+            row["latency_max"] = latency if row["latency_max"] is None else max(row["latency_max"], latency)
+    return [
+        (service_id, start, row["checks"], row["up"], row["down"], row["degraded"],
+         row["latency_count"], row["latency_sum"], row["latency_min"], row["latency_max"])
+        for (service_id, start), row in sorted(rollups.items())  # fixed lock order across concurrent writers
+    ]
+
+
+def write_rollups(cur, results: list):
+    """Add a batch of results to the hourly and daily rollup buckets of their checked_at"""
+    for table_name, bucket in (("monitoring_rollups_hourly", "hour"), ("monitoring_rollups_daily", "day")):
+        rows = aggregate_rollups(results, bucket)
+        if not rows:
+            return
+        psycopg2.extras.execute_values(cur, f"""
+            INSERT INTO {table_name} AS r (
+                service_id, bucket_start, checks, up_count, down_count, degraded_count,
+                latency_count, latency_sum_ms, latency_min_ms, latency_max_ms
+            )
+            VALUES %s
+            ON CONFLICT (service_id, bucket_start) DO UPDATE SET
+                checks = r.checks + EXCLUDED.checks,
+                up_count = r.up_count + EXCLUDED.up_count,
+                down_count = r.down_count + EXCLUDED.down_count,
+                degraded_count = r.degraded_count + EXCLUDED.degraded_count,
+                latency_count = r.latency_count + EXCLUDED.latency_count,
+                latency_sum_ms = r.latency_sum_ms + EXCLUDED.latency_sum_ms,
+                latency_min_ms = LEAST(r.latency_min_ms, EXCLUDED.latency_min_ms),
+                latency_max_ms = GREATEST(r.latency_max_ms, EXCLUDED.latency_max_ms)
+        """, rows,
+            template="(%s, %s::timestamp, %s, %s, %s, %s, %s, %s, %s::float8, %s::float8)",
+            page_size=1000)
+
+
+def write_results(cur, results: list):
+    """Insert the log rows and apply the status/counter updates for a batch of results.
+
+    The caller owns the transaction.
+    """
+    if not results:
+        return
+
+    logs = psycopg2.extras.execute_values(cur, """
+        INSERT INTO monitoring_logs (service_id, status, message, checked_at)
+        VALUES %s
+        RETURNING id, service_id, status, checked_at
+    """, [
+        (result["service_id"], result["status"], format_log_message(result["command"], result["output"]), result["checked_at"])
+        for result in results
+    ], page_size=1000, fetch=True)
+
+    write_rollups(cur, results)
+
+    transitions = []
+    updates = aggregate_status_updates(results)
+    if updates:
+        # "old" is a second scan of the table, so it still sees last_status from before this UPDATE
+        transitions = psycopg2.extras.execute_values(cur, """
+            UPDATE monitored_services AS s
+            SET
+                last_status = v.status,
+                success_count = COALESCE(v.success_count, s.success_count + v.success_inc),
+                failure_count = COALESCE(v.failure_count, s.failure_count + v.failure_inc),
+                updated_at = COALESCE(v.updated_at, NOW()),
+                comment = COALESCE(v.comment, s.comment)
+            FROM (VALUES %s) AS v(id, status, success_inc, failure_inc, success_count, failure_count, updated_at, comment),
+                monitored_services AS old
+            WHERE s.id = v.id AND old.id = s.id
+            RETURNING s.id, old.last_status, s.last_status, s.updated_at
+        """, updates,
+            template="(%s::int, %s, %s::int, %s::int, %s::int, %s::int, %s::timestamp, %s)",
+            page_size=1000, fetch=True)
+
+    notify_events(cur, logs, transitions)
+
+
+def notify_events(cur, logs: list, transitions: list):
+    """NOTIFY listeners of new log rows and of services whose status changed.
+
+    logs are (id, service_id, status, checked_at) rows, transitions are
+    (service_id, previous_status, status, updated_at) rows; unchanged
+    statuses are skipped.
+    """
+    events = [
+        {"type": "status", "service_id": service_id, "previous": previous, "status": current,
+         "updated_at": updated_at.isoformat() if updated_at else None}
+        for service_id, previous, current, updated_at in transitions
+        if previous != current
+    ] + [
+        {"type": "log", "id": log_id, "service_id": service_id, "status": status,
+         "checked_at": checked_at.isoformat() if checked_at else None}
+        for log_id, service_id, status, checked_at in logs
+    ]
+    for start in range(0, len(events), MONITORING_EVENTS_PER_NOTIFY):
+        payload = json.dumps(events[start:start + MONITORING_EVENTS_PER_NOTIFY], separators=(",", ":"))
+        cur.execute("SELECT pg_notify(%s, %s)", (MONITORING_EVENTS_CHANNEL, payload))
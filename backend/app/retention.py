@@ -0,0 +1,145 @@
+"""
+Retention for monitoring_logs
+Drops whole monthly partitions once every row in them is past retention and
+deletes the remaining expired rows in small throttled batches, so the purge
+never holds long locks or floods WAL
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from app.db import get_connection
+from app.models import DatabaseSchema, MIGRATION_LOCK_TIMEOUT
+
+LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', '90'))  # default when nothing is configured
+LOG_RETENTION_BATCH_SIZE = int(os.getenv('LOG_RETENTION_BATCH_SIZE', '5000'))  # rows per delete
+LOG_RETENTION_BATCH_PAUSE = float(os.getenv('LOG_RETENTION_BATCH_PAUSE', '0.5'))  # seconds between deletes
+
+RETENTION_CONFIG_NAME = 'log_retention'
+RETENTION_REPORT_NAME = 'log_retention_last_run'
+
+
+def default_retention_config() -> dict:
+    return {"default_days": LOG_RETENTION_DAYS, "by_type": {}}
+
+
+def get_retention_config() -> dict:
+    """Retention periods in days: a default plus overrides per service type"""
+    config = default_retention_config()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT configuration FROM dashboard_configs WHERE name = %s", (RETENTION_CONFIG_NAME,))
+            result = cur.fetchone()
+    if result and result[0]:
+        stored = json.loads(result[0])
+        config["default_days"] = int(stored.get("default_days") or config["default_days"])
+        config["by_type"] = {service_type: int(days) for service_type, days in (stored.get("by_type") or {}).items()}
+    return config
+
+
+def drop_expired_partitions(cur, cutoff: datetime) -> list:
+    """Drop monitoring_logs partitions whose rows are all older than cutoff"""
+    if not DatabaseSchema.is_partitioned(cur, 'monitoring_logs'):
+        return []
+
+    # Dropping a partition briefly locks the parent; give up rather than queue behind long queries
+    cur.execute("SET LOCAL lock_timeout = %s", (MIGRATION_LOCK_TIMEOUT,))
+    dropped = []
+    for name, lower, upper in DatabaseSchema.get_monitoring_logs_partitions(cur):
+        if datetime.combine(upper, datetime.min.time()) > cutoff:
+            continue
+        cur.execute(f"DROP TABLE {name}")
+        dropped.append(name)
+    return dropped
+
+
+def delete_expired_batch(cur, cutoff: datetime, service_type: str = None, excluded_types: list = None) -> int:
+    """Delete up to LOG_RETENTION_BATCH_SIZE rows older than cutoff.
+
+    With service_type only that type's logs are touched; otherwise every log
+    whose service type is not in excluded_types (including orphaned logs).
+    """
+    if service_type is not None:
+        scope = "l.service_id IN (SELECT id FROM monitored_services WHERE type = %s)"
+        params = [service_type]
+    else:
+        scope = """NOT EXISTS (
+            SELECT 1 FROM monitored_services s
+            WHERE s.id = l.service_id AND s.type = ANY(%s)
+        )"""
+        params = [list(excluded_types or [])]
+
+    # (id, checked_at) identifies a row on both the plain and the partitioned table
+    cur.execute(f"""
+        DELETE FROM monitoring_logs
+        WHERE (id, checked_at) IN (
+            SELECT l.id, l.checked_at
+            FROM monitoring_logs l
+            WHERE l.checked_at < %s AND {scope}
+            LIMIT %s
+        )
+    """, [cutoff] + params + [LOG_RETENTION_BATCH_SIZE])
+    return cur.rowcount
+
+
+def purge_monitoring_logs(stop_event=None, now: datetime = None) -> dict:
+    """Apply the retention policy and return a report of what was removed.
+
+    stop_event (a threading.Event) ends the run early between batches.
+    """
+    now = now or datetime.now()
+    started = time.monotonic()
+    config = get_retention_config()
+    by_type = config["by_type"]
+    report = {
+        "started_at": now.isoformat(),
+        "config": config,
+        "partitions_dropped": [],
+        "rows_deleted": {},
+        "completed": True,
+    }
+
+    # A partition can only go once it is past the longest retention that applies to anything
+    longest = max([config["default_days"]] + list(by_type.values()))
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            try:
+                report["partitions_dropped"] = drop_expired_partitions(cur, now - timedelta(days=longest))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error dropping expired monitoring_logs partitions: {e}")
+
+            groups = list(by_type.items()) + [(None, config["default_days"])]
+            try:
+                for service_type, days in groups:
+                    cutoff = now - timedelta(days=days)
+                    key = service_type or "default"
+                    report["rows_deleted"][key] = 0
+                    while report["completed"]:
+                        deleted = delete_expired_batch(cur, cutoff, service_type, excluded_types=list(by_type))
+                        conn.commit()
+                        report["rows_deleted"][key] += deleted
+                        if deleted < LOG_RETENTION_BATCH_SIZE:
+                            break
+                        if stop_event is not None and stop_event.wait(LOG_RETENTION_BATCH_PAUSE):
+                            report["completed"] = False
+                        elif stop_event is None:
+                            time.sleep(LOG_RETENTION_BATCH_PAUSE)
+            except Exception as e:
+                conn.rollback()
+                report["completed"] = False
+                report["error"] = str(e)
+                print(f"Error deleting expired monitoring_logs rows: {e}")
+
+            report["duration_seconds"] = round(time.monotonic() - started, 1)
+            cur.execute("""
+                INSERT INTO dashboard_configs (name, configuration)
+                VALUES (%s, %s)
+                ON CONFLICT (name)
+                DO UPDATE SET configuration = EXCLUDED.configuration
+            """, (RETENTION_REPORT_NAME, json.dumps(report)))
+            conn.commit()
+
+    return report
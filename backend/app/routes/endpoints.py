@@ -1,17 +1,30 @@
-from app.monitor import monitor_all_services, check_service, fetch_service
+from app.monitor import monitor_all_services, iter_monitor_all_services, check_service, fetch_service, fetch_services_change_token, fetch_services_changed_since
 from app.cron_manager import cron_manager
-from fastapi import APIRouter, Depends, HTTPException, status, Body, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Body, BackgroundTasks, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, IPvAnyAddress, constr, Field
 from typing import List, Optional
-from app.auth import verify_api_key
+from app.auth import verify_api_key, verify_api_key_or_query
 from app.db import get_connection, get_connection_pool  # Using connection pool
+from app import cloud, retention
+from app.results import make_result, notify_events, write_rollups
+from app.service_sync import upsert_services
+from app.upstream_cache import UpstreamCache
+from app.http_client import http_client
+from app.events import event_bus, format_sse, EVENTS_HEARTBEAT_INTERVAL
 import psycopg2.extras
+import asyncio
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Any
 import requests
+import csv
+import io
 import json
+import os
 import urllib3
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -21,6 +34,10 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 router = APIRouter()
 
+MONITORING_LOGS_MAX_PAGE_SIZE = int(os.getenv('MONITORING_LOGS_MAX_PAGE_SIZE', '5000'))
+SERVICES_DELTA_OVERLAP = float(os.getenv('SERVICES_DELTA_OVERLAP', '30'))  # seconds re-sent on every ?since= poll
+MONITORING_LOGS_EXPORT_BATCH_SIZE = int(os.getenv('MONITORING_LOGS_EXPORT_BATCH_SIZE', '5000'))  # rows per server-side fetch
+
 class PingRequest(BaseModel):
     ip: IPvAnyAddress  # validates IPv4 or IPv6 automatically
 
@@ -107,7 +124,7 @@ class MonitoringLogOut(BaseModel):
     name: Optional[str] = None  # Add service name field
     checked_at: datetime
     status: str
-    message: str
+    message: Optional[str] = None  # None when the request sets include_message=false
     notification_sent: Optional[bool] = None
     updated_at: Optional[datetime] = None
     comment: Optional[str] = None
@@ -119,6 +136,12 @@ class MonitoringLogFilter(BaseModel):
     id: Optional[int] = None  
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
+    # Keyset pagination: pass back the X-Next-Before-* headers of the previous page
+    before_checked_at: Optional[datetime] = None
+    before_id: Optional[int] = None
+    limit: int = Field(1000, ge=1, le=MONITORING_LOGS_MAX_PAGE_SIZE)
+    include_message: bool = True
+    message_chars: int = Field(2000, ge=1)  # longer messages are truncated in SQL
 
     class Config:
         orm_mode = True
@@ -156,6 +179,10 @@ class GroupingPreferences(BaseModel):
 class RefreshIntervalConfig(BaseModel):
     interval: int = 30
 
+class LogRetentionConfig(BaseModel):
+    default_days: int = Field(90, ge=1)
+    by_type: Dict[str, int] = {}
+
 @router.get("/grouping-preferences")
 def get_grouping_preferences(api_key: str = Depends(verify_api_key)):
     """Get dashboard grouping preferences"""
@@ -243,20 +270,65 @@ def update_refresh_interval(config: RefreshIntervalConfig, api_key: str = Depend
         print(f"Error updating refresh interval: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/log-retention")
+def get_log_retention(api_key: str = Depends(verify_api_key)):
+    """Get monitoring_logs retention periods (days, per service type)"""
+    try:
+        return retention.get_retention_config()
+    except Exception as e:
+        print(f"Error fetching log retention: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/log-retention")
+def update_log_retention(config: LogRetentionConfig, api_key: str = Depends(verify_api_key)):
+    """Update monitoring_logs retention periods; applied by the daemon's next retention run"""
+    if any(days < 1 for days in config.by_type.values()):
+        raise HTTPException(status_code=400, detail="Retention periods must be at least 1 day")
+    try:
+        print(f"Updating log retention: {config}")
+        config_json = json.dumps(config.dict())
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                # Upsert
+                cur.execute("""
+                    INSERT INTO dashboard_configs (name, configuration) 
+                    VALUES (%s, %s)
+                    ON CONFLICT (name) 
+                    DO UPDATE SET configuration = EXCLUDED.configuration
+                """, (retention.RETENTION_CONFIG_NAME, config_json))
+                conn.commit()
+        print("Log retention updated successfully")
+        return {"status": "success", "config": config}
+    except Exception as e:
+        print(f"Error updating log retention: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/log-retention/last-run")
+def get_log_retention_last_run(api_key: str = Depends(verify_api_key)):
+    """Report from the most recent retention run: partitions dropped and rows deleted per type"""
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT configuration FROM dashboard_configs WHERE name = %s", (retention.RETENTION_REPORT_NAME,))
+                result = cur.fetchone()
+                return json.loads(result[0]) if result and result[0] else {}
+    except Exception as e:
+        print(f"Error fetching log retention report: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/status", summary="Check service health", dependencies=[Depends(verify_api_key)])
 def get_status():
     return {"status": "status ok"}
 
 @router.get("/db-pool-status", summary="Check database connection pool status", dependencies=[Depends(verify_api_key)])
 def get_db_pool_status():
-    """Get database connection pool status"""
+    """Live pool usage: open/in use/idle connections, waiters, timeouts and an acquire-latency histogram"""
     try:
         pool = get_connection_pool()
         return {
-            "pool_type": "SimpleConnectionPool",
-            "min_connections": 1,
-            "max_connections": 10,
-            "pool_status": "active"
+            "pool_type": type(pool).__name__,
+            "pool_status": "active",
+            **pool.stats()
         }
     except Exception as e:
         return {
@@ -423,7 +495,7 @@ def insert_monitor_log(monitor_log: MonitoringLogCreate) -> int:
                 cur.execute("""
                     INSERT INTO monitoring_logs (service_id, status, message, comment)
                     VALUES (%s, %s, %s, %s)
-                    RETURNING id
+                    RETURNING id, service_id, status, checked_at
                 """, (monitor_log.service_id, monitor_log.status, monitor_log.message, monitor_log.comment))
                 result = cur.fetchone()
                 
@@ -439,14 +511,20 @@ def insert_monitor_log(monitor_log: MonitoringLogCreate) -> int:
                 failure_inc = 1 if status_val == 'down' else 0
                 
                 cur.execute("""
-                    UPDATE monitored_services
+                    UPDATE monitored_services AS s
                     SET
                         last_status = %s,
-                        success_count = success_count + %s,
-                        failure_count = failure_count + %s,
+                        success_count = s.success_count + %s,
+                        failure_count = s.failure_count + %s,
                         updated_at = NOW()
-                    WHERE id = %s
+                    FROM monitored_services AS old
+                    WHERE s.id = %s AND old.id = s.id
+                    RETURNING s.id, old.last_status, s.last_status, s.updated_at
                 """, (status_val, success_inc, failure_inc, monitor_log.service_id))
+                transitions = cur.fetchall()
+
+                write_rollups(cur, [make_result(monitor_log.service_id, status_val, monitor_log.message or "", "", checked_at=result[3])])
+                notify_events(cur, [result], transitions)
 
                 conn.commit()
                 return log_id
@@ -505,10 +583,63 @@ def delete_service(service_id: int):
 
 # API endpoints
 @router.get("/services", response_model=List[ServiceOut], dependencies=[Depends(verify_api_key)])
-def list_services():
+def list_services(request: Request, response: Response, since: Optional[datetime] = None):
+    """All services, answering 304 when nothing changed since the client's ETag.
+    
+    With ?since= only services updated after that time are returned, as
+    {"server_time", "services", "ids"}: pass server_time as the next since,
+    merge services by id and rebuild the list in the order of ids (which
+    also drops deleted services).
+    """
+    etag = fetch_services_change_token()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    if since is not None:
+        # Overlap the window so rows from transactions still open at the last poll are not missed
+        server_time, changed, ids = fetch_services_changed_since(since - timedelta(seconds=SERVICES_DELTA_OVERLAP))
+        return JSONResponse(jsonable_encoder({
+            "server_time": server_time,
+            "services": [ServiceOut.model_validate(service) for service in changed],
+            "ids": ids,
+        }), headers=headers)
+    
+    response.headers.update(headers)
     services = fetch_all_services()
     return services
 
+@router.get("/events", dependencies=[Depends(verify_api_key_or_query)])
+async def stream_events(request: Request):
+    """Server-Sent Events stream of status changes and new check results.
+
+    Events: "status" ({service_id, previous, status, updated_at}) when a
+    service changes state, "log" ({id, service_id, status, checked_at}) for
+    every check result, and "resync" when events may have been missed and
+    the client should reload. The API key may be passed as ?api_key=.
+    """
+    async def stream():
+        queue = event_bus.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            event_bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/services/{service_id}", response_model=ServiceOut, dependencies=[Depends(verify_api_key)])
 def get_service(service_id: int):
     service = fetch_service(service_id)
@@ -516,6 +647,60 @@ def get_service(service_id: int):
         raise HTTPException(status_code=404, detail="Service not found")
     return service
 
+@router.get("/services/{service_id}/uptime", dependencies=[Depends(verify_api_key)])
+def get_service_uptime(
+    service_id: int,
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+):
+    """Availability over time from the hourly/daily rollups (default: last 30 days by day, last 48 hours by hour)"""
+    to_time = to_time or datetime.now()
+    from_time = from_time or to_time - (timedelta(days=30) if bucket == "day" else timedelta(hours=48))
+    table_name = "monitoring_rollups_daily" if bucket == "day" else "monitoring_rollups_hourly"
+    try:
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                # Include the bucket that contains from_time
+                cur.execute(f"""
+                    SELECT bucket_start, checks, up_count, down_count, degraded_count,
+                           latency_count, latency_sum_ms, latency_min_ms, latency_max_ms
+                    FROM {table_name}
+                    WHERE service_id = %s
+                      AND bucket_start >= date_trunc(%s, %s::timestamp)
+                      AND bucket_start <= %s
+                    ORDER BY bucket_start
+                """, (service_id, bucket, from_time, to_time))
+                rows = cur.fetchall()
+    except Exception as e:
+        print(f"Database error in get_service_uptime: {e}")
+        raise HTTPException(status_code=500, detail="Database error")
+
+    buckets = []
+    for row in rows:
+        buckets.append({
+            "bucket_start": row["bucket_start"],
+            "checks": row["checks"],
+            "up": row["up_count"],
+            "down": row["down_count"],
+            "degraded": row["degraded_count"],
+            "uptime_percent": round(100.0 * row["up_count"] / row["checks"], 2) if row["checks"] else None,
+            "latency_avg_ms": round(row["latency_sum_ms"] / row["latency_count"], 2) if row["latency_count"] else None,
+            "latency_min_ms": row["latency_min_ms"],
+            "latency_max_ms": row["latency_max_ms"],
+        })
+    total_checks = sum(row["checks"] for row in rows)
+    total_up = sum(row["up_count"] for row in rows)
+    return {
+        "service_id": service_id,
+        "bucket": bucket,
+        "from": from_time,
+        "to": to_time,
+        "checks": total_checks,
+        "uptime_percent": round(100.0 * total_up / total_checks, 2) if total_checks else None,
+        "buckets": buckets,
+    }
+
 @router.post("/services", response_model=ServiceOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(verify_api_key)])
 def create_service(service: ServiceCreate):
     service_id = insert_service(service)
@@ -564,8 +749,16 @@ def delete_existing_service(service_id: int):
 ####################### Run monitoring for all services #######################
 @router.post("/monitor/all", summary="Run monitoring check for all services", dependencies=[Depends(verify_api_key)])
 def api_monitor_all_services():
-    results = monitor_all_services()
-    return {"results": results}
+    """Check every service concurrently, streaming one NDJSON line per result as it completes.
+    
+    Each line is {"service_id", "name", "status", "output"}; checks that miss
+    MONITOR_ALL_DEADLINE come back with status "timeout".
+    """
+    def stream():
+        for result in iter_monitor_all_services():
+            yield json.dumps(jsonable_encoder(result)) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 # Run monitoring check for one service by ID
 @router.post("/monitor/{service_id}", summary="Run monitoring check for one service by ID", dependencies=[Depends(verify_api_key)])
@@ -586,11 +779,25 @@ def api_monitor_all_services_bg(background_tasks: BackgroundTasks):
 
 ##Monitoring logs table##
 @router.post("/monitoring_logs", response_model=List[MonitoringLogOut], dependencies=[Depends(verify_api_key)])
-def get_monitoring_logs(filter: MonitoringLogFilter):
+def get_monitoring_logs(filter: MonitoringLogFilter, response: Response):
+    """Logs newest first, one page at a time.
+    
+    When a page is full, X-Next-Before-Checked-At and X-Next-Before-Id give
+    the cursor for the next (older) page.
+    """
     try:
-        query = "SELECT monitoring_logs.id, monitored_services.name, monitoring_logs.service_id, monitoring_logs.status, monitoring_logs.message, monitoring_logs.checked_at FROM monitoring_logs LEFT JOIN monitored_services ON monitored_services.id = monitoring_logs.service_id "
+        if filter.include_message:
+            message_column = """
+                CASE WHEN length(monitoring_logs.message) > %s
+                     THEN left(monitoring_logs.message, %s) || '... (truncated)'
+                     ELSE monitoring_logs.message
+                END AS message"""
+            params = [filter.message_chars, filter.message_chars]
+        else:
+            message_column = "NULL AS message"
+            params = []
+        query = f"SELECT monitoring_logs.id, monitored_services.name, monitoring_logs.service_id, monitoring_logs.status, {message_column}, monitoring_logs.checked_at FROM monitoring_logs LEFT JOIN monitored_services ON monitored_services.id = monitoring_logs.service_id "
         conditions = []
-        params = []
 
         if filter.id is not None:
             conditions.append("monitoring_logs.service_id = %s")
@@ -606,26 +813,107 @@ def get_monitoring_logs(filter: MonitoringLogFilter):
             conditions.append("monitoring_logs.checked_at <= %s")
             params.append(filter.end_time)
 
+        if filter.before_checked_at and filter.before_id is not None:
+            conditions.append("(monitoring_logs.checked_at, monitoring_logs.id) < (%s, %s)")
+            params.extend([filter.before_checked_at, filter.before_id])
+        elif filter.before_checked_at:
+            conditions.append("monitoring_logs.checked_at < %s")
+            params.append(filter.before_checked_at)
+
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
 
-        query += " ORDER BY monitoring_logs.checked_at DESC LIMIT 1000"
+        query += " ORDER BY monitoring_logs.checked_at DESC, monitoring_logs.id DESC LIMIT %s"
+        params.append(filter.limit)
 
         with get_connection() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                 cur.execute(query, tuple(params))
                 logs = cur.fetchall()
-                
-                # Truncate large messages to prevent Content-Length mismatch
-                for log in logs:
-                    if log.get('message') and len(log['message']) > 2000:
-                        log['message'] = log['message'][:2000] + '... (truncated)'
-                
-                return logs
+        
+        if len(logs) == filter.limit:
+            response.headers["X-Next-Before-Checked-At"] = logs[-1]["checked_at"].isoformat()
+            response.headers["X-Next-Before-Id"] = str(logs[-1]["id"])
+        return logs
     except Exception as e:
         print(f"Database error in get_monitoring_logs: {e}")
         raise HTTPException(status_code=500, detail="Database error")
 
+def stream_monitoring_logs(query: str, params: tuple, export_format: str):
+    """Yield export chunks from a server-side cursor so memory stays flat however many rows match"""
+    columns = ["id", "service_id", "name", "checked_at", "status", "message"]
+    with get_connection() as conn:
+        try:
+            # Named cursor: rows are fetched from the server itersize at a time
+            with conn.cursor(name="monitoring_logs_export") as cur:
+                cur.itersize = MONITORING_LOGS_EXPORT_BATCH_SIZE
+                cur.execute(query, params)
+                if export_format == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerow(columns)
+                while True:
+                    rows = cur.fetchmany(MONITORING_LOGS_EXPORT_BATCH_SIZE)
+                    if not rows:
+                        break
+                    rows = [(row[0], row[1], row[2], row[3].isoformat() if row[3] else None, row[4], row[5]) for row in rows]
+                    if export_format == "csv":
+                        writer.writerows(rows)
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                    else:
+                        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+        except Exception as e:
+            # Headers are already sent, so the only signal left is a cut-short body
+            print(f"Database error in export_monitoring_logs: {e}")
+            raise
+        finally:
+            conn.rollback()
+
+@router.get("/monitoring_logs/export", dependencies=[Depends(verify_api_key)])
+def export_monitoring_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    service_id: Optional[int] = None,
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+):
+    """Stream monitoring history as NDJSON or CSV, oldest first, with no row cap"""
+    query = """
+        SELECT monitoring_logs.id, monitoring_logs.service_id, monitored_services.name,
+               monitoring_logs.checked_at, monitoring_logs.status, monitoring_logs.message
+        FROM monitoring_logs
+        LEFT JOIN monitored_services ON monitored_services.id = monitoring_logs.service_id
+    """
+    conditions = []
+    params = []
+
+    if service_id is not None:
+        conditions.append("monitoring_logs.service_id = %s")
+        params.append(service_id)
+    if status_filter:
+        conditions.append("monitoring_logs.status = ANY(%s)")
+        params.append(status_filter)
+    if start_time:
+        conditions.append("monitoring_logs.checked_at >= %s")
+        params.append(start_time)
+    if end_time:
+        conditions.append("monitoring_logs.checked_at <= %s")
+        params.append(end_time)
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY monitoring_logs.checked_at, monitoring_logs.id"
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"monitoring_logs_{datetime.now():%Y%m%d_%H%M%S}.{format}"
+    return StreamingResponse(
+        stream_monitoring_logs(query, tuple(params), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 # Cronjob Management Endpoints
 @router.get("/cronjobs", response_model=List[CronJobOut], dependencies=[Depends(verify_api_key)])
 def list_cronjobs():
@@ -671,66 +959,28 @@ def reload_cronjobs():
         raise HTTPException(status_code=500, detail=f"Error reloading cron jobs: {str(e)}")
 
 
-CLOUD_BASE_URL = "https://cloud-monitoring.corp.spc.int"
-CLOUD_CONFIG_NAME = "cloud-monitoring.corp.spc.int"
-
-def get_stored_token():
-    try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT configuration FROM dashboard_configs WHERE name = %s", (CLOUD_CONFIG_NAME,))
-                result = cur.fetchone()
-                if result:
-                    return result[0]
-    except Exception as e:
-        print(f"Error getting stored token: {e}")
-    return None
-
 def authenticate_and_store_token():
-    auth_url = f"{CLOUD_BASE_URL}/api/collections/users/auth-with-password"
-    auth_payload = {
-        "identity": "divesha@spc.int",
-        "password": "Un2345678"
-    }
-    headers = {'Content-Type': 'application/json'}
-    
-    print(f"Authenticating to {auth_url}...")
     try:
-        response = requests.post(auth_url, headers=headers, json=auth_payload, verify=False)
-        response.raise_for_status()
-        
-        auth_data = response.json()
-        token = auth_data.get("token")
-        
-        if not token:
-            raise Exception("Failed to retrieve token from authentication response")
-            
-        # Store in DB
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                # Check if exists
-                cur.execute("SELECT id FROM dashboard_configs WHERE name = %s", (CLOUD_CONFIG_NAME,))
-                if cur.fetchone():
-                    cur.execute("UPDATE dashboard_configs SET configuration = %s WHERE name = %s", (token, CLOUD_CONFIG_NAME))
-                else:
-                    cur.execute("INSERT INTO dashboard_configs (name, configuration) VALUES (%s, %s)", (CLOUD_CONFIG_NAME, token))
-                conn.commit()
-        
-        return token
-        
+        token = cloud.authenticate_and_store_token()
     except Exception as e:
         print(f"Authentication failed: {e}")
         raise HTTPException(status_code=500, detail=f"Authentication failed: {str(e)}")
+    cloud.cloud_token.set(token)
+    return token
 
 @router.post("/cloud/sync", dependencies=[Depends(verify_api_key)])
 def sync_cloud():
-    token = get_stored_token()
+    try:
+        token = cloud.cloud_token.get()
+    except Exception as e:
+        print(f"Error getting stored token: {e}")
+        token = None
     
     if not token:
         print("No token found in DB, authenticating...")
         token = authenticate_and_store_token()
     
-    systems_url = f"{CLOUD_BASE_URL}/api/collections/systems/records"
+    systems_url = cloud.CLOUD_SYSTEMS_URL
     
     def fetch_systems(auth_token):
         headers = {
@@ -738,7 +988,7 @@ def sync_cloud():
             'Content-Type': 'application/json'
         }
         print(f"Fetching systems from {systems_url}...")
-        return requests.get(systems_url, headers=headers, verify=False)
+        return http_client.get(systems_url, upstream="pocketbase", headers=headers, verify=False)
 
     try:
         response = fetch_systems(token)
@@ -769,54 +1019,38 @@ def sync_cloud():
         if "items" in data:
             try:
                 print(f"Syncing {len(data['items'])} items to database...")
+                rows = []
+                for item in data["items"]:
+                    name = item.get('name')
+                    if not name:
+                        continue
+
+                    try:
+                        port = int(item.get('port')) if item.get('port') else None
+                    except (ValueError, TypeError):
+                        port = None
+
+                    rows.append({
+                        "name": name,
+                        "ip_address": item.get('host', ''),
+                        "port": port,
+                        "protocol": 'api',
+                        "check_interval_sec": 300,
+                        "interval_type": 'minutes',
+                        "interval_value": 5,
+                        "interval_unit": 'minutes',
+                        "last_status": item.get('status', 'unknown'),
+                        "created_at": item.get('created'),
+                        "updated_at": item.get('updated'),
+                        "is_active": True,
+                        "type": 'Server Cloud',
+                    })
+
                 with get_connection() as conn:
                     with conn.cursor() as cur:
-                        for item in data["items"]:
-                            name = item.get('name')
-                            if not name:
-                                continue
-
-                            ip_address = item.get('host', '')
-                            try:
-                                port = int(item.get('port')) if item.get('port') else None
-                            except (ValueError, TypeError):
-                                port = None
-
-                            status_val = item.get('status', 'unknown')
-                            updated_str = item.get('updated')
-                            created_str = item.get('created')
-
-                            # Check if service exists
-                            cur.execute("SELECT id FROM monitored_services WHERE name = %s", (name,))
-                            existing = cur.fetchone()
-
-                            if existing:
-                                # Update existing service
-                                cur.execute("""
-                                    UPDATE monitored_services 
-                                    SET ip_address = %s,
-                                        port = %s,
-                                        last_status = %s,
-                                        updated_at = %s,
-                                        type = 'Server Cloud'
-                                    WHERE id = %s
-                                """, (ip_address, port, status_val, updated_str, existing[0]))
-                            else:
-                                # Insert new service
-                                cur.execute("""
-                                    INSERT INTO monitored_services (
-                                        name, ip_address, port, protocol, 
-                                        check_interval_sec, interval_type, interval_value, interval_unit,
-                                        last_status, created_at, updated_at, is_active, type
-                                    ) VALUES (
-                                        %s, %s, %s, 'api',
-                                        300, 'minutes', 5, 'minutes',
-                                        %s, %s, %s, true, 'Server Cloud'
-                                    )
-                                """, (name, ip_address, port, status_val, created_str, updated_str))
-                        
+                        inserted, updated = upsert_services(cur, rows, ["ip_address", "port", "last_status", "updated_at"])
                         conn.commit()
-                        print("Database sync complete.")
+                        print(f"Database sync complete: {inserted} inserted, {updated} updated.")
             except Exception as e:
                 print(f"Error syncing to database: {e}")
                 # Continue to return data even if DB sync fails
@@ -836,7 +1070,7 @@ def get_ocean_datasets():
     """Fetch dataset information from Ocean Middleware API"""
     try:
         print(f"Fetching datasets from {OCEAN_MIDDLEWARE_URL}")
-        response = requests.get(f"{OCEAN_MIDDLEWARE_URL}?format=json", verify=False, timeout=30)
+        response = http_client.get(f"{OCEAN_MIDDLEWARE_URL}?format=json", upstream="ocean_middleware", verify=False, timeout=30)
         response.raise_for_status()
         
         data = response.json()
@@ -863,7 +1097,7 @@ def sync_ocean_datasets():
     """Sync ocean middleware datasets to local database"""
     try:
         print(f"Syncing datasets from {OCEAN_MIDDLEWARE_URL}")
-        response = requests.get(f"{OCEAN_MIDDLEWARE_URL}?format=json", verify=False, timeout=30)
+        response = http_client.get(f"{OCEAN_MIDDLEWARE_URL}?format=json", upstream="ocean_middleware", verify=False, timeout=30)
         response.raise_for_status()
         
         data = response.json()
@@ -871,72 +1105,39 @@ def sync_ocean_datasets():
         # Filter out Deleted tasks
         filtered_data = [task for task in data if task.get('health') != 'Deleted']
         
-        synced_count = 0
-        updated_count = 0
+        rows = []
+        for task in filtered_data:
+            task_name = task.get('task_name')
+            if not task_name:
+                continue
+            
+            health = task.get('health', 'unknown')
+            
+            # Map health to status
+            last_status = 'up' if health == 'Excellent' else 'degraded' if health in ['Good', 'Fair'] else 'down'
+            
+            rows.append({
+                "name": task_name,
+                "ip_address": 'ocean-middleware.spc.int',
+                "port": 443,
+                "protocol": 'api',
+                "check_interval_sec": 3600,
+                "interval_type": 'hours',
+                "interval_value": 1,
+                "interval_unit": 'hours',
+                "last_status": last_status,
+                "success_count": task.get('success_count', 0),
+                "failure_count": task.get('fail_count', 0),
+                "is_active": True,
+                "type": 'datasets',
+                "comment": f"Health: {health}, Dataset ID: {task.get('dataset_id')}",
+            })
         
         with get_connection() as conn:
             with conn.cursor() as cur:
-                for task in filtered_data:
-                    task_name = task.get('task_name')
-                    if not task_name:
-                        continue
-                    
-                    health = task.get('health', 'unknown')
-                    status = task.get('status', 'unknown')
-                    last_run_time = task.get('last_run_time')
-                    next_run_time = task.get('next_run_time')
-                    success_count = task.get('success_count', 0)
-                    fail_count = task.get('fail_count', 0)
-                    dataset_id = task.get('dataset_id')
-                    
-                    # Map health to status
-                    last_status = 'up' if health == 'Excellent' else 'degraded' if health in ['Good', 'Fair'] else 'down'
-                    
-                    # Check if service exists
-                    cur.execute("SELECT id FROM monitored_services WHERE name = %s AND type = 'datasets'", (task_name,))
-                    existing = cur.fetchone()
-                    
-                    if existing:
-                        # Update existing service
-                        cur.execute("""
-                            UPDATE monitored_services 
-                            SET last_status = %s,
-                                success_count = %s,
-                                failure_count = %s,
-                                updated_at = NOW(),
-                                comment = %s
-                            WHERE id = %s
-                        """, (
-                            last_status,
-                            success_count,
-                            fail_count,
-                            f"Health: {health}, Dataset ID: {dataset_id}",
-                            existing[0]
-                        ))
-                        updated_count += 1
-                    else:
-                        # Insert new service
-                        cur.execute("""
-                            INSERT INTO monitored_services (
-                                name, ip_address, port, protocol, 
-                                check_interval_sec, interval_type, interval_value, interval_unit,
-                                last_status, success_count, failure_count, is_active, type, comment
-                            ) VALUES (
-                                %s, %s, %s, 'api',
-                                3600, 'hours', 1, 'hours',
-                                %s, %s, %s, true, 'datasets', %s
-                            )
-                        """, (
-                            task_name,
-                            'ocean-middleware.spc.int',
-                            443,
-                            last_status,
-                            success_count,
-                            fail_count,
-                            f"Health: {health}, Dataset ID: {dataset_id}"
-                        ))
-                        synced_count += 1
-                
+                synced_count, updated_count = upsert_services(
+                    cur, rows, ["last_status", "success_count", "failure_count", "comment"]
+                )
                 conn.commit()
         
         return {
@@ -959,6 +1160,29 @@ def sync_ocean_datasets():
 # THREDDS Monitoring Endpoints
 OCEAN_MAIN_MENU_URL = "https://ocean-middleware.spc.int/middleware/api/main_menu/"
 OCEAN_LAYER_WEB_MAP_URL = "https://ocean-middleware.spc.int/middleware/api/layer_web_map/"
+THREDDS_SYNC_WORKERS = int(os.getenv('THREDDS_SYNC_WORKERS', '8'))  # concurrent layer_web_map requests
+THREDDS_LAYER_CACHE_TTL = float(os.getenv('THREDDS_LAYER_CACHE_TTL', '3600'))  # seconds a layer is reused before revalidating
+
+# Layers only change when edited upstream, so a re-sync mostly reads this cache
+layer_cache = UpstreamCache(ttl=THREDDS_LAYER_CACHE_TTL, name="ocean_middleware")
+
+def fetch_layers(layer_ids: list) -> tuple:
+    """Fetch layer_web_map records concurrently; returns ({id: layer}, {id: error})"""
+    layers, errors = {}, {}
+    if not layer_ids:
+        return layers, errors
+    with ThreadPoolExecutor(max_workers=min(THREDDS_SYNC_WORKERS, len(layer_ids)), thread_name_prefix="layer") as executor:
+        futures = {
+            executor.submit(layer_cache.get_json, f"{OCEAN_LAYER_WEB_MAP_URL}{layer_id}/", timeout=30, verify=False): layer_id
+            for layer_id in layer_ids
+        }
+        for future in as_completed(futures):
+            layer_id = futures[future]
+            try:
+                layers[layer_id] = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                errors[layer_id] = e
+    return layers, errors
 
 @router.post("/thredds/sync", dependencies=[Depends(verify_api_key)])
 def sync_thredds_services():
@@ -967,114 +1191,72 @@ def sync_thredds_services():
         print(f"Syncing THREDDS services from {OCEAN_MAIN_MENU_URL}")
         
         # Fetch main menu data with theme_id=1
-        response = requests.get(
+        response = http_client.get(
             f"{OCEAN_MAIN_MENU_URL}?format=json&theme_id=1",
+            upstream="ocean_middleware",
             verify=False,
             timeout=30
         )
         response.raise_for_status()
         menu_data = response.json()
         
-        synced_count = 0
-        updated_count = 0
         error_count = 0
+        rows = []
+        
+        # Collect every content item first so each layer is fetched once, however many items share it
+        items = []
+        for menu_item in menu_data:
+            for item in menu_item.get('content', []):
+                layer_info_id = item.get('layer_information')
+                item_name = item.get('name', 'Unknown')
+                if not layer_info_id:
+                    print(f"Skipping {item_name}: No layer_information ID")
+                    continue
+                items.append((layer_info_id, item_name))
+        
+        layers, layer_errors = fetch_layers(list(dict.fromkeys(layer_info_id for layer_info_id, _ in items)))
+        print(f"Fetched {len(layers)} layer(s), {len(layer_errors)} failed")
+        
+        for layer_info_id, item_name in items:
+            if layer_info_id in layer_errors:
+                print(f"Error fetching layer {layer_info_id} for {item_name}: {layer_errors[layer_info_id]}")
+                error_count += 1
+                continue
+            
+            # Get the URL from layer data
+            base_url = layers[layer_info_id].get('url')
+            if not base_url:
+                print(f"Skipping {item_name}: No URL in layer data")
+                error_count += 1
+                continue
+            
+            # Check every 3 days = 3 * 24 * 60 * 60 = 259200 seconds
+            rows.append({
+                "name": item_name,
+                "ip_address": f"{base_url}?service=WMS&version=1.3.0&request=GetCapabilities",
+                "port": 443,
+                "protocol": 'wms',
+                "check_interval_sec": 259200,
+                "interval_type": 'daily',
+                "interval_value": 3,
+                "interval_unit": 'days',
+                "last_status": 'unknown',
+                "success_count": 0,
+                "failure_count": 0,
+                "is_active": True,
+                "type": 'thredds',
+                "comment": f"Layer ID: {layer_info_id}, Base URL: {base_url}",
+                "cron_expression": '',
+                "cron_job_name": '',
+                "collection": 'uncategorized',
+            })
         
         with get_connection() as conn:
             with conn.cursor() as cur:
-                # Iterate through all menu items and their content
-                for menu_item in menu_data:
-                    content_items = menu_item.get('content', [])
-                    
-                    for item in content_items:
-                        layer_info_id = item.get('layer_information')
-                        item_name = item.get('name', 'Unknown')
-                        
-                        if not layer_info_id:
-                            print(f"Skipping {item_name}: No layer_information ID")
-                            continue
-                        
-                        try:
-                            # Fetch layer web map data
-                            layer_response = requests.get(
-                                f"{OCEAN_LAYER_WEB_MAP_URL}{layer_info_id}/",
-                                verify=False,
-                                timeout=30
-                            )
-                            layer_response.raise_for_status()
-                            layer_data = layer_response.json()
-                            
-                            # Get the URL from layer data
-                            base_url = layer_data.get('url')
-                            if not base_url:
-                                print(f"Skipping {item_name}: No URL in layer data")
-                                error_count += 1
-                                continue
-                            
-                            # Add WMS GetCapabilities suffix
-                            wms_url = f"{base_url}?service=WMS&version=1.3.0&request=GetCapabilities"
-                            
-                            # Extract host from URL for ip_address field
-                            from urllib.parse import urlparse
-                            parsed_url = urlparse(base_url)
-                            host = parsed_url.netloc
-                            
-                            # Check if service exists
-                            cur.execute(
-                                "SELECT id FROM monitored_services WHERE name = %s AND type = 'thredds'",
-                                (item_name,)
-                            )
-                            existing = cur.fetchone()
-                            
-                            if existing:
-                                # Update existing service
-                                cur.execute("""
-                                    UPDATE monitored_services 
-                                    SET ip_address = %s,
-                                        port = 443,
-                                        protocol = 'wms',
-                                        updated_at = NOW(),
-                                        comment = %s
-                                    WHERE id = %s
-                                """, (
-                                    wms_url,
-                                    f"Layer ID: {layer_info_id}, Base URL: {base_url}",
-                                    existing[0]
-                                ))
-                                conn.commit()  # Commit after each successful operation
-                                updated_count += 1
-                            else:
-                                # Insert new service
-                                # Check every 3 days = 3 * 24 * 60 * 60 = 259200 seconds
-                                cur.execute("""
-                                    INSERT INTO monitored_services (
-                                        name, ip_address, port, protocol,
-                                        check_interval_sec, interval_type, interval_value, interval_unit,
-                                        last_status, success_count, failure_count, is_active, type, comment,
-                                        cron_expression, cron_job_name, collection
-                                    ) VALUES (
-                                        %s, %s, 443, 'wms',
-                                        259200, 'daily', 3, 'days',
-                                        'unknown', 0, 0, true, 'thredds', %s,
-                                        '', '', 'uncategorized'
-                                    )
-                                """, (
-                                    item_name,
-                                    wms_url,
-                                    f"Layer ID: {layer_info_id}, Base URL: {base_url}"
-                                ))
-                                conn.commit()  # Commit after each successful operation
-                                synced_count += 1
-                                
-                        except requests.exceptions.RequestException as e:
-                            print(f"Error fetching layer {layer_info_id} for {item_name}: {e}")
-                            error_count += 1
-                            continue
-                        except Exception as e:
-                            print(f"Unexpected error processing {item_name}: {e}")
-                            conn.rollback()  # Rollback on database errors
-                            error_count += 1
-                            continue
-
+                synced_count, updated_count = upsert_services(
+                    cur, rows, ["ip_address", "port", "protocol", "comment"]
+                )
+                conn.commit()
         
         return {
             "status": "success",
@@ -1089,4 +1271,24 @@ def sync_thredds_services():
         raise HTTPException(status_code=500, detail=f"Failed to sync THREDDS services: {str(e)}")
     except Exception as e:
         print(f"Unexpected error during THREDDS sync: {e}")
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+@router.get("/thredds/changes", dependencies=[Depends(verify_api_key)])
+def get_thredds_changes(service_id: Optional[int] = None, limit: int = Query(100, ge=1, le=1000)):
+    """Recent GetCapabilities changes, newest first, with the layers added and removed"""
+    try:
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT c.id, c.service_id, s.name AS service_name, c.detected_at,
+                           c.previous_hash, c.content_hash, c.layers_added, c.layers_removed, c.added, c.removed
+                    FROM thredds_capability_changes c
+                    JOIN monitored_services s ON s.id = c.service_id
+                    WHERE %(service_id)s::integer IS NULL OR c.service_id = %(service_id)s
+                    ORDER BY c.detected_at DESC, c.id DESC
+                    LIMIT %(limit)s
+                """, {"service_id": service_id, "limit": limit})
+                return cur.fetchall()
+    except Exception as e:
+        print(f"Database error in get_thredds_changes: {e}")
+        raise HTTPException(status_code=500, detail="Database error")
@@ -0,0 +1,87 @@
+"""
+Timing scheduler for the monitoring daemon
+Keeps active services in a min-heap keyed on their next run time
+"""
+import heapq
+import itertools
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+class CheckScheduler:
+    """Min-heap of service ids ordered by next run time.
+
+    Entries are invalidated lazily: rescheduling or removing a service leaves
+    its old heap entry in place and it is skipped when it reaches the top.
+    """
+
+    def __init__(self):
+        self._heap = []  # (next_run, seq, service_id)
+        self._current = {}  # service_id -> seq of its live heap entry
+        self._services = {}  # service_id -> latest service row
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._services)
+
+    def __contains__(self, service_id):
+        return service_id in self._services
+
+    def sync(self, services: List[Dict], now: datetime):
+        """Replace the service set, scheduling new services immediately.
+
+        Returns (added_ids, removed_ids).
+        """
+        incoming = {service['id']: service for service in services}
+        added = [service_id for service_id in incoming if service_id not in self._services]
+        removed = [service_id for service_id in self._services if service_id not in incoming]
+
+        for service_id in removed:
+            del self._services[service_id]
+            self._current.pop(service_id, None)
+
+        # Existing services keep their slot but pick up edited settings
+        self._services = incoming
+        for service_id in added:
+            self.schedule(service_id, now)
+
+        self._compact()
+        return added, removed
+
+    def schedule(self, service_id: int, next_run: datetime):
+        """Set the next run time for a service"""
+        if service_id not in self._services:
+            return
+        seq = next(self._seq)
+        self._current[service_id] = seq
+        heapq.heappush(self._heap, (next_run, seq, service_id))
+
+    def pop_due(self, now: datetime) -> List[Dict]:
+        """Remove and return every service whose run time has passed"""
+        return [service for service, _ in self.pop_due_with_times(now)]
+
+    def pop_due_with_times(self, now: datetime) -> List[Tuple[Dict, datetime]]:
+        """Like pop_due, paired with the time each service was scheduled for"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            next_run, seq, service_id = heapq.heappop(self._heap)
+            if self._current.get(service_id) != seq:
+                continue  # stale entry
+            del self._current[service_id]
+            due.append((self._services[service_id], next_run))
+        return due
+
+    def next_run_time(self) -> Optional[datetime]:
+        """Earliest pending run time, or None when nothing is scheduled"""
+        while self._heap:
+            next_run, seq, service_id = self._heap[0]
+            if self._current.get(service_id) == seq:
+                return next_run
+            heapq.heappop(self._heap)
+        return None
+
+    def _compact(self):
+        """Rebuild the heap once stale entries outnumber live ones"""
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._heap = [entry for entry in self._heap if self._current.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
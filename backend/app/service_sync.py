@@ -0,0 +1,121 @@
+"""
+Bulk upsert of synced services
+The Cloud, Ocean Middleware and THREDDS syncs write their whole item list
+with one INSERT ... ON CONFLICT (name, type) DO UPDATE instead of a SELECT
+plus an UPDATE or INSERT per item. Ocean Portal tasks are only ever added,
+by reconcile_ocean_tasks, which the API and monitor_oceans_portal.py share.
+"""
+import psycopg2.extras
+
+NAME_TYPE_KEY = 'uq_monitored_services_name_type'
+
+
+def has_name_type_key(cur) -> bool:
+    cur.execute("SELECT 1 FROM pg_indexes WHERE tablename = 'monitored_services' AND indexname = %s", (NAME_TYPE_KEY,))
+    return cur.fetchone() is not None
+
+
+def update_assignments(update_columns: list, value: str) -> str:
+    """SET list for update_columns; value formats the new value, e.g. "EXCLUDED.{}".
+
+    updated_at is bumped to NOW() unless it is one of the columns.
+    """
+    assignments = [f"{column} = {value.format(column)}" for column in update_columns]
+    if "updated_at" not in update_columns:
+        assignments.append("updated_at = NOW()")
+    return ", ".join(assignments)
+
+
+def upsert_services(cur, rows: list, update_columns: list) -> tuple:
+    """Insert or update monitored_services rows keyed on (name, type).
+
+    rows are dicts with the same keys, including name and type. Existing
+    services only get update_columns overwritten, plus updated_at = NOW()
+    unless updated_at is one of them. Returns (inserted, updated).
+    The caller owns the transaction.
+    """
+    if not rows:
+        return 0, 0
+
+    # One statement cannot touch a row twice; as with sequential writes, the last item for a key wins
+    rows = list({(row["name"], row["type"]): row for row in rows}.values())
+    columns = list(rows[0])
+    values = [tuple(row[column] for column in columns) for row in rows]
+
+    if not has_name_type_key(cur):
+        # Duplicate (name, type) pairs kept the unique index from being created
+        return upsert_services_row_by_row(cur, columns, values, update_columns)
+
+    # Column names come from the sync code, never from upstream data
+    query = f"""
+        INSERT INTO monitored_services ({", ".join(columns)})
+        VALUES %s
+        ON CONFLICT (name, type) DO UPDATE SET {update_assignments(update_columns, "EXCLUDED.{}")}
+        RETURNING (xmax = 0) AS inserted
+    """
+    flags = psycopg2.extras.execute_values(cur, query, values, page_size=1000, fetch=True)
+    inserted = sum(1 for (was_inserted,) in flags if was_inserted)
+    return inserted, len(flags) - inserted
+
+
+def upsert_services_row_by_row(cur, columns: list, values: list, update_columns: list) -> tuple:
+    """Fallback for upsert_services while the (name, type) key is missing"""
+    update = f"UPDATE monitored_services SET {update_assignments(update_columns, '%s')} WHERE name = %s AND type = %s"
+    insert = f"INSERT INTO monitored_services ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+    inserted = updated = 0
+    for row in values:
+        record = dict(zip(columns, row))
+        cur.execute(update, [record[column] for column in update_columns] + [record["name"], record["type"]])
+        if cur.rowcount:
+            updated += 1
+        else:
+            cur.execute(insert, row)
+            inserted += 1
+    return inserted, updated
+
+
+OCEAN_TASK_ENDPOINT = 'ocean-middleware.spc.int/middleware/api/'
+OCEAN_TASK_INTERVALS = {
+    'daily': ('daily', 1, 'days', 1),  # interval_type, interval_value, interval_unit, check_interval_sec
+    'monthly': ('specific_day', 4, 'months', 60),
+}
+
+
+def reconcile_ocean_tasks(cur, tasks: list) -> tuple:
+    """Insert the Ocean Portal task services that are not monitored yet.
+
+    tasks are dicts with name, when, final_status and final_comments.
+    Existing names are loaded in one query and every missing task goes in
+    with one multi-row INSERT; existing services are left as they are and
+    tasks with an unknown frequency are skipped. Returns (inserted names,
+    existing names). The caller owns the transaction.
+    """
+    if not tasks:
+        return [], []
+
+    cur.execute("SELECT name FROM monitored_services WHERE name = ANY(%s)", ([task["name"] for task in tasks],))
+    existing = {row[0] for row in cur.fetchall()}
+
+    values = {}  # name -> row, first task with a name wins
+    for task in tasks:
+        if task["name"] in existing or task["name"] in values:
+            continue
+        interval = OCEAN_TASK_INTERVALS.get(task["when"])
+        if not interval:
+            print(f"Skipping unknown frequency: {task['when']}")
+            continue
+        interval_type, interval_value, interval_unit, check_interval_sec = interval
+        values[task["name"]] = (
+            task["name"], OCEAN_TASK_ENDPOINT, 80, 'http', check_interval_sec, interval_type, interval_value,
+            interval_unit, '', '', task["final_status"], 0, 0, task["final_comments"], True,
+        )
+
+    if values:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO monitored_services
+                (name, ip_address, port, protocol, check_interval_sec, interval_type, interval_value, interval_unit,
+                 cron_expression, cron_job_name, last_status, success_count, failure_count, comment, is_active)
+            VALUES %s
+        """, list(values.values()), page_size=1000)
+    return list(values), sorted(existing)
@@ -0,0 +1,155 @@
+"""
+Tests for the Ocean Portal task index and download file date parsing
+Expected dates are what monitor.parse_ocean_date_exact returned for the same
+file names before the parsers were compiled per dataset.
+"""
+from datetime import datetime
+
+import pytest
+
+from app.ocean_tasks import (
+    NO_DATES, TaskIndexCache, build_task_index, compile_date_parser, download_dates, evaluate_ocean_tasks,
+)
+
+NOW = datetime(2025, 7, 15, 12, 0)
+
+# (task_name, prefix, infix, suffix, filename, expected (start, end))
+PARSER_CASES = [
+    pytest.param(
+        'download_coral_bleaching_monthly_outlook', 'ignored_', '%Y%m%d', '.nc',
+        'cfsv2_outlook-060perc_4mon-and-wkly_v5_icwk20250706_for_20250706to20251026.nc',
+        ('2025-07-06T00:00:00', 'none'), id="coral outlook overrides prefix and suffix"),
+    pytest.param(
+        'download_bluelink_daily_forecast', 'bluelink_', '%Y%m%d', '.nc', 'bluelink_20250701.nc',
+        NO_DATES, id="bluelink never has dates"),
+    pytest.param(
+        'calculate_sst_anomalies_monthly', 'ignored_', 'ignored', '.ignored', 'oisst-avhrr-v02r01.202506.nc',
+        ('2025-06-01T00:00:00', 'none'), id="sst anomalies"),
+    pytest.param(
+        'calculate_sst_anomalies_monthly', '', '', '', 'oisst-avhrr-v02r01.2025.nc',
+        NO_DATES, id="sst anomalies bad date"),
+    pytest.param(
+        'download_gfs', 'gfs_', '%Y%m%d_%H', '.grb2', 'gfs_20250701_12.grb2',
+        ('2025-07-01T00:00:00', 'none'), id="hour infix keeps the day"),
+    pytest.param(
+        'download_gfs', 'gfs_', '%Y%m%d_%H', '.grb2', 'gfs_2025_12.grb2',
+        NO_DATES, id="hour infix bad date"),
+    pytest.param(
+        'download_range', 'range_', '%Y%m%d_%Y%m%d', '.nc', 'range_20250601_20250630.nc',
+        ('2025-06-01T00:00:00', '2025-06-30T00:00:00'), id="date range"),
+    pytest.param(
+        'download_range', 'range_', '%Y%m%d_%Y%m%d', '.nc', 'range_20250601_2025.nc',
+        NO_DATES, id="date range bad end"),
+    pytest.param(
+        'calculate_ssh_monthly ', 'ssh_', '%Y%m_%Y%m', '.nc', 'ssh_202505_202506.nc',
+        ('2025-05-01T00:00:00', '2025-06-01T00:00:00'), id="ssh monthly"),
+    pytest.param(
+        'calculate_ssh_monthly', 'ssh_', 'ignored', '.nc', 'ssh_202505_202513.nc',
+        NO_DATES, id="ssh monthly bad month"),
+    pytest.param(
+        'download_monthly', 'monthly_', '%Y%m', '.nc', 'monthly_202506.nc',
+        ('2025-06-01T00:00:00', 'none'), id="single date"),
+    pytest.param(
+        'download_monthly', 'monthly_', '%Y%m', '.nc', 'monthly_2025.nc',
+        NO_DATES, id="single date bad date"),
+    pytest.param(
+        'download_static', 'static', 'none', '.nc', 'static.nc',
+        NO_DATES, id="none infix"),
+    pytest.param(
+        'download_no_suffix', 'daily_', '%Y%m%d', '', 'daily_20250701',
+        NO_DATES, id="empty suffix slices to nothing"),
+]
+
+
+@pytest.mark.parametrize("task_name, prefix, infix, suffix, filename, expected", PARSER_CASES)
+def test_compile_date_parser(task_name, prefix, infix, suffix, filename, expected):
+    assert compile_date_parser(task_name, prefix, infix, suffix)(filename) == expected
+
+
+def test_range_without_matching_infix_raises():
+    parse = compile_date_parser('download_range', 'range_', '%Y%m%d', '.nc')
+    with pytest.raises(ValueError):
+        parse('range_20250601_20250630.nc')
+
+
+def test_ssh_monthly_without_a_date_range_has_no_dates():
+    # The old parser fell through to None here and the task failed on unpacking it
+    parse = compile_date_parser('calculate_ssh_monthly', 'ssh_', '%Y%m_%Y%m', '.nc')
+    assert parse('ssh_2025_05.nc') == NO_DATES
+
+
+def dataset(dataset_id, infix='%Y%m%d', frequency_days=1, frequency_months=0, **fields):
+    return dict({
+        'id': dataset_id,
+        'frequency_hours': 0,
+        'frequency_days': frequency_days,
+        'frequency_months': frequency_months,
+        'download_file_prefix': 'file_',
+        'download_file_infix': infix,
+        'download_file_suffix': '.nc',
+    }, **fields)
+
+
+def task(task_id, last='file_20250714.nc', next_file='file_20250715.nc', task_name='download_daily'):
+    return {'id': task_id, 'task_name': task_name, 'last_download_file': last, 'next_download_file': next_file}
+
+
+def test_download_dates_without_both_files():
+    assert download_dates(dataset(1), task(1, last=None)) == (NO_DATES, NO_DATES)
+    assert download_dates(dataset(1), task(1, next_file='')) == (NO_DATES, NO_DATES)
+    assert download_dates(dataset(1), task(1)) == (
+        ('2025-07-15T00:00:00', 'none'), ('2025-07-14T00:00:00', 'none'),
+    )
+
+
+def test_build_task_index_first_item_per_id_wins():
+    index = build_task_index(
+        [dataset(1), dataset(1, frequency_days=0, frequency_months=1), dataset(2)],
+        [task(1), task(1, last='file_20240101.nc'), task(3)],
+    )
+
+    assert list(index) == [1]  # task 3 has no dataset
+    assert index[1]["when"] == "daily"
+    assert index[1]["task"]["last_download_file"] == 'file_20250714.nc'
+    assert index[1]["error"] is None
+
+
+def test_evaluate_ocean_tasks():
+    monthly = dict(frequency_days=0, frequency_months=1)
+    index = build_task_index(
+        [
+            dataset(1),
+            dataset(2, infix='%Y%m', **monthly),
+            dataset(3, infix='%Y%m', **monthly),
+            dataset(4, infix='%Y%m%d', **monthly),
+            dataset(5, frequency_days=0),
+            dataset(6, infix='%Y%m_%Y%m', download_file_prefix='ssh_', **monthly),
+        ],
+        [
+            task(1, last='file_20250713.nc'),
+            task(2, next_file='file_202506.nc'),  # dataset 2 runs a month behind
+            task(3, next_file='file_202506.nc'),
+            task(4, next_file='file_20250701_20250731.nc'),  # infix has no range
+            task(5),
+            task(6, next_file='ssh_2025_07.nc', last='ssh_2025_06.nc', task_name='calculate_ssh_monthly'),
+        ],
+    )
+
+    statuses = evaluate_ocean_tasks(index, NOW)
+
+    assert statuses[1] == ('up', '')
+    assert statuses[2] == ('up', '')
+    assert statuses[3] == ('down', '')
+    assert statuses[4][0] == 'unknown' and statuses[4][1].startswith("Error checking ocean service: ")
+    assert statuses[5] == ('unknown', "Unknown frequency: unknown")
+    # SSH monthly files without a YYYYMM_YYYYMM range are reported as having no date
+    assert statuses[6] == ('unknown', "Handle this later because the date is none")
+
+
+def test_task_index_cache_rebuilds_only_for_new_payloads():
+    cache = TaskIndexCache()
+    datasets, tasks = [dataset(1)], [task(1)]
+
+    first = cache.get(datasets, tasks)
+    assert cache.get(datasets, tasks) is first
+    assert cache.get(list(datasets), tasks) is not first
@@ -0,0 +1,119 @@
+"""
+Tests for the batched ICMP pinger
+"""
+import socket
+import struct
+
+from app import pinger as pinger_module
+from app.pinger import ICMP_ECHO_REPLY, ICMP_ECHO_REQUEST, IcmpPinger, icmp_checksum, summarize
+
+
+def test_icmp_checksum_known_values():
+    # RFC 1071 section 3 example
+    assert icmp_checksum(bytes.fromhex("0001f203f4f5f6f7")) == 0x220D
+    # Echo request, id 0x1234, seq 1, no payload
+    assert icmp_checksum(bytes.fromhex("0800000012340001")) == 0xE5CA
+
+
+def test_icmp_checksum_verifies_and_pads_odd_lengths():
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, 0x1234, 7) + b"abc"
+    checksum = icmp_checksum(header)
+    packet = header[:2] + struct.pack("!H", checksum) + header[4:]
+
+    assert icmp_checksum(packet) == 0
+    assert icmp_checksum(b"abc") == icmp_checksum(b"abc\x00")
+
+
+def test_summarize():
+    result = summarize("example.org", 4, [10.0, 20.0, 30.0])
+
+    assert result["status"] == "up"
+    assert result["command"] == "ICMP echo example.org x4"
+    assert result["latency_ms"] == 20.0
+    assert result["packet_loss"] == 25.0
+    assert result["output"] == "4 packets transmitted, 3 received, 25% packet loss, rtt min/avg/max = 10.000/20.000/30.000 ms"
+
+
+def test_summarize_without_replies():
+    assert summarize("example.org", 2, []) == {
+        "status": "down",
+        "output": "2 packets transmitted, 0 received, 100% packet loss",
+        "command": "ICMP echo example.org x2",
+        "latency_ms": None,
+        "packet_loss": 100.0,
+    }
+    assert summarize("example.org", 0, [])["packet_loss"] == 100.0
+
+
+class FakeIcmpSocket:
+    """Answers echo requests sent to the hosts in `answering` from a queue"""
+
+    def __init__(self, sock_type, answering, reply_ident=None, extra_replies=()):
+        self.type = sock_type
+        self.answering = answering
+        self.reply_ident = reply_ident
+        self.queue = list(extra_replies)
+        self.sent = []
+
+    def sendto(self, packet, address):
+        self.sent.append((packet, address))
+        _, _, _, ident, seq = struct.unpack("!BBHHH", packet[:8])
+        if address[0] in self.answering:
+            ident = ident if self.reply_ident is None else self.reply_ident
+            self.queue.append((self.frame(echo_reply(ident, seq)), address))
+
+    def recvfrom(self, size):
+        return self.queue.pop(0)
+
+    def frame(self, data):
+        if self.type == socket.SOCK_RAW:
+            return b"\x45" + b"\x00" * 19 + data  # 20 byte IPv4 header
+        return data
+
+
+def echo_reply(ident, seq, icmp_type=ICMP_ECHO_REPLY):
+    return struct.pack("!BBHHH", icmp_type, 0, 0, ident, seq) + b"\x00" * 8
+
+
+def ping_with(monkeypatch, sock, addresses, count=2):
+    monkeypatch.setattr(pinger_module.select, "select", lambda r, w, x, timeout: (r if sock.queue else [], [], []))
+    hosts = list(addresses)
+    return IcmpPinger()._ping_socket(sock, socket.AF_INET, hosts, addresses, count, 0.01)
+
+
+def test_ping_socket_matches_replies_by_sequence_and_source(monkeypatch):
+    addresses = {"a": (socket.AF_INET, "10.0.0.1"), "b": (socket.AF_INET, "10.0.0.2")}
+    stray = [
+        (echo_reply(0, 0, icmp_type=ICMP_ECHO_REQUEST), ("10.0.0.2", 0)),  # not a reply
+        (echo_reply(0, 1), ("10.0.0.9", 0)),  # right seq, wrong source
+        (echo_reply(0, 999), ("10.0.0.2", 0)),  # nothing outstanding
+        (b"\x00\x00", ("10.0.0.2", 0)),  # truncated
+    ]
+    sock = FakeIcmpSocket(socket.SOCK_DGRAM, answering={"10.0.0.1"}, extra_replies=stray)
+
+    results = ping_with(monkeypatch, sock, addresses)
+
+    assert len(sock.sent) == 4
+    assert [address for _, address in sock.sent] == [("10.0.0.1", 0), ("10.0.0.2", 0)] * 2
+    for packet, _ in sock.sent:
+        assert icmp_checksum(packet) == 0
+    assert results["a"]["status"] == "up" and results["a"]["packet_loss"] == 0.0
+    assert results["b"]["status"] == "down" and results["b"]["packet_loss"] == 100.0
+
+
+def test_raw_socket_strips_the_ip_header_and_checks_the_ident(monkeypatch):
+    addresses = {"a": (socket.AF_INET, "10.0.0.1")}
+
+    sock = FakeIcmpSocket(socket.SOCK_RAW, answering={"10.0.0.1"})
+    assert ping_with(monkeypatch, sock, addresses)["a"]["status"] == "up"
+
+    # Raw sockets see every reply on the host; another process's are ignored
+    foreign = FakeIcmpSocket(socket.SOCK_RAW, answering={"10.0.0.1"}, reply_ident=IcmpPinger()._ident ^ 1)
+    assert ping_with(monkeypatch, foreign, addresses)["a"]["status"] == "down"
+
+
+def test_sequence_numbers_wrap():
+    pinger = IcmpPinger()
+    pinger._seq = 0xFFFE
+    assert pinger._next_seqs(4) == [0xFFFE, 0xFFFF, 0, 1]
+    assert pinger._next_seqs(1) == [2]
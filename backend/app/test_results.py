@@ -0,0 +1,119 @@
+"""
+Tests for batching check results into status updates and rollups
+"""
+import json
+from datetime import datetime
+
+from app.results import (
+    MONITORING_EVENTS_PER_NOTIFY, aggregate_rollups, aggregate_status_updates, bucket_start, make_result,
+    notify_events,
+)
+
+CHECKED_AT = datetime(2025, 7, 1, 10, 15, 30)
+
+
+def result(service_id, status, **fields):
+    fields.setdefault("checked_at", CHECKED_AT)
+    return make_result(service_id, status, "output", "command", **fields)
+
+
+def test_make_result_defaults_checked_at_to_now():
+    before = datetime.now()
+    made = make_result(1, "up", "output", "command")
+    assert before <= made["checked_at"] <= datetime.now()
+    assert make_result(1, "up", "output", "command", checked_at=CHECKED_AT)["checked_at"] == CHECKED_AT
+
+
+def test_status_updates_last_result_wins_and_counters_add_up():
+    updates = aggregate_status_updates([
+        result(2, "up"),
+        result(1, "down"),
+        result(2, "down"),
+        result(1, "up"),
+        result(2, "degraded"),
+        result(1, "up"),
+    ])
+
+    assert updates == [
+        (1, "up", 2, 1, None, None, None, None),
+        (2, "degraded", 1, 2, None, None, None, None),
+    ]
+
+
+def test_status_updates_keep_the_latest_absolute_fields():
+    upstream_time = datetime(2025, 7, 1, 9, 0)
+    updates = aggregate_status_updates([
+        result(1, "up", success_count=10, failure_count=1, comment="first"),
+        result(1, "down", success_count=10, failure_count=2, updated_at=upstream_time),
+        result(1, "down"),  # None fields do not clear earlier values
+    ])
+
+    assert updates == [(1, "down", 1, 2, 10, 2, upstream_time, "first")]
+
+
+def test_status_updates_skip_log_only_results():
+    updates = aggregate_status_updates([
+        result(1, "up"),
+        result(1, "down", log_only=True),
+        result(2, "down", log_only=True),
+    ])
+
+    assert updates == [(1, "up", 1, 0, None, None, None, None)]
+
+
+def test_bucket_start():
+    assert bucket_start(CHECKED_AT, "hour") == datetime(2025, 7, 1, 10, 0)
+    assert bucket_start(CHECKED_AT, "day") == datetime(2025, 7, 1, 0, 0)
+
+
+def test_rollups_count_statuses_and_latency_per_bucket_of_check_time():
+    rows = aggregate_rollups([
+        result(1, "up", latency_ms=30.0),
+        result(1, "up", latency_ms=10.0),
+        result(1, "down"),
+        result(1, "degraded", latency_ms=20.0),
+        result(1, "unknown"),
+        result(1, "up", latency_ms=5.0, checked_at=datetime(2025, 7, 1, 11, 0)),
+        result(2, "down", log_only=True),
+    ])
+
+    assert rows == [
+        (1, datetime(2025, 7, 1, 10, 0), 5, 2, 1, 1, 3, 60.0, 10.0, 30.0),
+        (1, datetime(2025, 7, 1, 11, 0), 1, 1, 0, 0, 1, 5.0, 5.0, 5.0),
+    ]
+
+
+def test_daily_rollups_merge_hours_and_sort_by_service():
+    rows = aggregate_rollups([
+        result(2, "up", checked_at=datetime(2025, 7, 1, 23, 59)),
+        result(1, "down", checked_at=datetime(2025, 7, 1, 0, 1)),
+        result(2, "up", checked_at=datetime(2025, 7, 1, 1, 0)),
+    ], bucket="day")
+
+    assert rows == [
+        (1, datetime(2025, 7, 1), 1, 0, 1, 0, 0, 0.0, None, None),
+        (2, datetime(2025, 7, 1), 2, 2, 0, 0, 0, 0.0, None, None),
+    ]
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+
+def test_notify_events_skip_unchanged_statuses_and_chunk_payloads():
+    cur = RecordingCursor()
+    logs = [(log_id, 1, "up", CHECKED_AT) for log_id in range(MONITORING_EVENTS_PER_NOTIFY)]
+    transitions = [(1, "down", "up", CHECKED_AT), (2, "up", "up", CHECKED_AT)]
+
+    notify_events(cur, logs, transitions)
+
+    payloads = [json.loads(params[1]) for _, params in cur.executed]
+    assert [len(payload) for payload in payloads] == [MONITORING_EVENTS_PER_NOTIFY, 1]
+    assert payloads[0][0] == {
+        "type": "status", "service_id": 1, "previous": "down", "status": "up", "updated_at": CHECKED_AT.isoformat(),
+    }
+    assert all(event["type"] == "log" for event in payloads[0][1:] + payloads[1])
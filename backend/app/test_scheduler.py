@@ -0,0 +1,104 @@
+"""
+Tests for the check scheduler heap
+"""
+from datetime import datetime, timedelta
+
+from app.scheduler import CheckScheduler
+
+NOW = datetime(2025, 7, 1, 12, 0, 0)
+
+
+def services(*ids):
+    return [{"id": service_id, "name": f"service-{service_id}"} for service_id in ids]
+
+
+def test_sync_schedules_new_services_now():
+    scheduler = CheckScheduler()
+    added, removed = scheduler.sync(services(1, 2), NOW)
+
+    assert added == [1, 2]
+    assert removed == []
+    assert len(scheduler) == 2 and 1 in scheduler
+    assert scheduler.next_run_time() == NOW
+    assert [service["id"] for service in scheduler.pop_due(NOW)] == [1, 2]
+    assert scheduler.next_run_time() is None
+
+
+def test_pop_due_orders_by_run_time_and_leaves_future_entries():
+    scheduler = CheckScheduler()
+    scheduler.sync(services(1, 2, 3), NOW)
+    scheduler.pop_due(NOW)
+    scheduler.schedule(1, NOW + timedelta(seconds=30))
+    scheduler.schedule(2, NOW + timedelta(seconds=10))
+    scheduler.schedule(3, NOW + timedelta(seconds=60))
+
+    due = scheduler.pop_due_with_times(NOW + timedelta(seconds=30))
+
+    assert [(service["id"], when) for service, when in due] == [
+        (2, NOW + timedelta(seconds=10)),
+        (1, NOW + timedelta(seconds=30)),
+    ]
+    assert scheduler.next_run_time() == NOW + timedelta(seconds=60)
+
+
+def test_reschedule_invalidates_the_old_entry():
+    scheduler = CheckScheduler()
+    scheduler.sync(services(1), NOW)
+    scheduler.schedule(1, NOW + timedelta(seconds=60))
+
+    # The original entry at NOW is still in the heap but no longer live
+    assert scheduler.pop_due(NOW) == []
+    assert scheduler.next_run_time() == NOW + timedelta(seconds=60)
+
+    # Moving it earlier wins over the later entry too
+    scheduler.schedule(1, NOW + timedelta(seconds=5))
+    assert [service["id"] for service in scheduler.pop_due(NOW + timedelta(seconds=60))] == [1]
+    assert scheduler.next_run_time() is None
+
+
+def test_removed_services_are_skipped_and_not_rescheduled():
+    scheduler = CheckScheduler()
+    scheduler.sync(services(1, 2), NOW)
+    added, removed = scheduler.sync(services(2), NOW)
+
+    assert added == [] and removed == [1]
+    assert 1 not in scheduler
+    assert [service["id"] for service in scheduler.pop_due(NOW)] == [2]
+
+    scheduler.schedule(1, NOW)  # unknown ids are ignored
+    assert scheduler.pop_due(NOW + timedelta(days=1)) == []
+
+
+def test_sync_keeps_the_slot_of_existing_services_with_their_new_row():
+    scheduler = CheckScheduler()
+    scheduler.sync(services(1), NOW)
+    scheduler.pop_due(NOW)
+    scheduler.schedule(1, NOW + timedelta(seconds=30))
+
+    added, removed = scheduler.sync([{"id": 1, "name": "renamed"}], NOW + timedelta(seconds=10))
+
+    assert (added, removed) == ([], [])
+    assert scheduler.next_run_time() == NOW + timedelta(seconds=30)
+    assert [service["name"] for service in scheduler.pop_due(NOW + timedelta(seconds=30))] == ["renamed"]
+
+
+def test_next_run_time_drops_stale_entries_from_the_top():
+    scheduler = CheckScheduler()
+    scheduler.sync(services(1, 2), NOW)
+    scheduler.schedule(1, NOW + timedelta(seconds=20))
+    scheduler.schedule(2, NOW + timedelta(seconds=10))
+
+    assert scheduler.next_run_time() == NOW + timedelta(seconds=10)
+    assert len(scheduler._heap) == 2
+
+
+def test_compaction_bounds_the_heap():
+    scheduler = CheckScheduler()
+    scheduler.sync(services(1), NOW)
+    for offset in range(200):
+        scheduler.schedule(1, NOW + timedelta(seconds=offset))
+    assert len(scheduler._heap) == 201
+
+    scheduler.sync(services(1), NOW)
+
+    assert scheduler._heap == [(NOW + timedelta(seconds=199), scheduler._current[1], 1)]
@@ -0,0 +1,113 @@
+"""
+Tests for the bulk upsert of synced services
+"""
+from app import service_sync
+from app.service_sync import OCEAN_TASK_ENDPOINT, reconcile_ocean_tasks, update_assignments, upsert_services
+
+
+class FakeCursor:
+    """Records statements; the (name, type) key exists unless has_key is False"""
+
+    def __init__(self, has_key=True, existing=()):
+        self.has_key = has_key
+        self.existing = set(existing)  # (name, type) pairs already in monitored_services
+        self.executed = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        if query.lstrip().startswith("UPDATE"):
+            self.rowcount = 1 if tuple(params[-2:]) in self.existing else 0
+
+    def fetchone(self):
+        return (1,) if self.has_key else None
+
+    def fetchall(self):
+        return [(name,) for name, _ in self.existing]
+
+
+def fake_execute_values(monkeypatch, existing=()):
+    """Stand-in for execute_values that reports rows whose (name, type) is new as inserted"""
+    calls = []
+
+    def execute_values(cur, query, values, page_size=100, fetch=False, **kwargs):
+        calls.append((query, values))
+        if fetch:
+            return [((row[0], row[1]) not in existing,) for row in values]
+
+    monkeypatch.setattr(service_sync.psycopg2.extras, "execute_values", execute_values)
+    return calls
+
+
+def service(name, service_type="cloud", status="up"):
+    return {"name": name, "type": service_type, "last_status": status}
+
+
+def test_update_assignments():
+    assert update_assignments(["last_status"], "EXCLUDED.{}") == "last_status = EXCLUDED.last_status, updated_at = NOW()"
+    assert update_assignments(["updated_at"], "%s") == "updated_at = %s"
+
+
+def test_upsert_services_without_rows():
+    cur = FakeCursor()
+    assert upsert_services(cur, [], ["last_status"]) == (0, 0)
+    assert cur.executed == []
+
+
+def test_upsert_services_keeps_the_last_row_per_name_and_type(monkeypatch):
+    calls = fake_execute_values(monkeypatch, existing={("b", "cloud")})
+    rows = [service("a", status="down"), service("b"), service("a", "thredds"), service("a", status="up")]
+
+    assert upsert_services(FakeCursor(), rows, ["last_status"]) == (2, 1)
+
+    [(query, values)] = calls
+    assert values == [("a", "cloud", "up"), ("b", "cloud", "up"), ("a", "thredds", "up")]
+    assert "ON CONFLICT (name, type) DO UPDATE SET last_status = EXCLUDED.last_status, updated_at = NOW()" in query
+
+
+def test_upsert_services_falls_back_to_row_by_row_without_the_key(monkeypatch):
+    calls = fake_execute_values(monkeypatch)
+    cur = FakeCursor(has_key=False, existing={("b", "cloud")})
+
+    assert upsert_services(cur, [service("a"), service("b", status="down"), service("b")], ["last_status"]) == (1, 1)
+
+    assert calls == []
+    statements = [(query.split()[0], params) for query, params in cur.executed[1:]]
+    assert statements == [
+        ("UPDATE", ["up", "a", "cloud"]),
+        ("INSERT", ("a", "cloud", "up")),
+        ("UPDATE", ["up", "b", "cloud"]),
+    ]
+
+
+def ocean_task(name, when="daily"):
+    return {"name": name, "when": when, "final_status": "up", "final_comments": f"{name} ok"}
+
+
+def test_reconcile_ocean_tasks_inserts_only_missing_tasks(monkeypatch):
+    calls = fake_execute_values(monkeypatch)
+    cur = FakeCursor(existing={("existing", "ocean")})
+    tasks = [
+        ocean_task("existing"),
+        ocean_task("daily"),
+        ocean_task("monthly", "monthly"),
+        ocean_task("daily", "monthly"),  # first task with a name wins
+        ocean_task("hourly", "hourly"),  # unknown frequency
+    ]
+
+    assert reconcile_ocean_tasks(cur, tasks) == (["daily", "monthly"], ["existing"])
+
+    assert cur.executed[0][1] == (["existing", "daily", "monthly", "daily", "hourly"],)
+    [(_, values)] = calls
+    assert values == [
+        ("daily", OCEAN_TASK_ENDPOINT, 80, 'http', 1, 'daily', 1, 'days', '', '', "up", 0, 0, "daily ok", True),
+        ("monthly", OCEAN_TASK_ENDPOINT, 80, 'http', 60, 'specific_day', 4, 'months', '', '', "up", 0, 0, "monthly ok", True),
+    ]
+
+
+def test_reconcile_ocean_tasks_without_anything_to_insert(monkeypatch):
+    calls = fake_execute_values(monkeypatch)
+
+    assert reconcile_ocean_tasks(FakeCursor(), []) == ([], [])
+    assert reconcile_ocean_tasks(FakeCursor(existing={("a", "ocean")}), [ocean_task("a")]) == ([], ["a"])
+    assert calls == []
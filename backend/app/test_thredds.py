@@ -0,0 +1,53 @@
+"""
+Tests for streaming GetCapabilities validation
+"""
+import time
+
+import pytest
+
+from app.thredds import inspect_capabilities
+
+CAPABILITIES = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<WMS_Capabilities version="1.3.0"><Capability><Layer><Name>sst</Name></Layer></Capability></WMS_Capabilities>'
+)
+
+
+class FakeResponse:
+    def __init__(self, chunks, content_type="text/xml"):
+        self.chunks = chunks
+        self.headers = {"content-type": content_type}
+
+    def iter_content(self, chunk_size=None):
+        return iter(self.chunks)
+
+
+@pytest.mark.parametrize("chunks", [
+    pytest.param([CAPABILITIES], id="plain"),
+    pytest.param([b"\r\n\n  " + CAPABILITIES], id="leading newlines"),
+    pytest.param([b"\xef\xbb\xbf" + CAPABILITIES], id="byte order mark"),
+    pytest.param([b"\n", b"  \n", CAPABILITIES], id="whitespace-only chunks"),
+])
+@pytest.mark.parametrize("deep", [False, True])
+def test_leading_whitespace_before_the_xml_declaration(chunks, deep):
+    result = inspect_capabilities(FakeResponse(chunks), time.perf_counter(), deep=deep)
+
+    assert result["status"] == "up", result["message"]
+    assert result["root"] == "WMS_Capabilities"
+
+
+def test_tracking_hashes_the_raw_body_and_lists_layers():
+    body = b"\n" + CAPABILITIES
+    result = inspect_capabilities(FakeResponse([body[:40], body[40:]]), time.perf_counter(), track=True)
+
+    assert result["status"] == "up"
+    assert result["layers"] == ["sst"]
+    assert result["bytes"] == len(body)
+    assert result["content_hash"] is not None
+
+
+def test_other_xml_roots_are_degraded():
+    result = inspect_capabilities(FakeResponse([b"\n<ServiceExceptionReport/>"]), time.perf_counter())
+
+    assert result["status"] == "degraded"
+    assert result["root"] == "ServiceExceptionReport"
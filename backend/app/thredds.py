@@ -0,0 +1,267 @@
+"""
+Streaming validation of WMS GetCapabilities responses
+Reads the body chunk by chunk and settles up/degraded as soon as the root
+element is known, so a check never holds a multi-megabyte catalogue in
+memory unless THREDDS_DEEP_VALIDATION asks for the whole document to be
+parsed.
+
+With THREDDS_CHANGE_DETECTION on (off by default), each service's
+ETag/Last-Modified, content hash and layer names are kept in
+thredds_capabilities and checks send conditional requests, so an unchanged
+catalogue costs a 304. A 200 is only read past the root element to hash it
+when that pays off: the server sent validators (later checks get 304s) or
+the last hash is older than THREDDS_CHANGE_HASH_INTERVAL. Differences in
+layers are recorded in thredds_capability_changes.
+"""
+import hashlib
+import json
+import os
+import time
+from xml.etree import ElementTree
+
+from app.db import get_connection
+
+THREDDS_MAX_BYTES = int(os.getenv('THREDDS_MAX_BYTES', str(20 * 1024 * 1024)))  # stop reading a response after this many bytes
+THREDDS_DEEP_VALIDATION = os.getenv('THREDDS_DEEP_VALIDATION', 'false').lower() == 'true'  # parse the whole document
+THREDDS_CHANGE_DETECTION = os.getenv('THREDDS_CHANGE_DETECTION', 'false').lower() == 'true'  # conditional requests + capabilities change events
+THREDDS_CHANGE_HASH_INTERVAL = int(os.getenv('THREDDS_CHANGE_HASH_INTERVAL', '86400'))  # seconds between full reads when the server sends no validators
+THREDDS_CHUNK_SIZE = 64 * 1024
+
+
+def local_name(tag: str) -> str:
+    """Tag without its {namespace}"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def inspect_capabilities(response, started: float, deep: bool = THREDDS_DEEP_VALIDATION,
+                         max_bytes: int = THREDDS_MAX_BYTES, track: bool = False) -> dict:
+    """Classify a streamed (stream=True) GetCapabilities response.
+
+    started is the perf_counter() taken before the request was sent. Returns
+    {"status", "message", "root", "bytes", "ttfb_ms", "content_hash", "layers"};
+    the caller closes the response. The status is settled at the root
+    element; only deep validation lets the rest of the document change it.
+    content_hash and layers (sorted layer names, XML only) are only set when
+    track is on and the whole body was read within max_bytes.
+    """
+    content_type = response.headers.get('content-type', 'unknown').lower()
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    kind = None  # "xml", "json" or "other", from the first non-blank byte
+    root = None
+    error = None
+    truncated = False
+    json_chunks = []  # deep validation of JSON only
+    bytes_read = 0
+    ttfb_ms = None
+    full = deep or track  # read to the end instead of stopping at the root
+    digest = hashlib.sha256()
+    layers = set() if track else None
+    path = []  # open elements, for picking out Layer/Name when tracking
+    complete = False
+
+    for chunk in response.iter_content(chunk_size=THREDDS_CHUNK_SIZE):
+        if not chunk:
+            continue
+        if ttfb_ms is None:
+            ttfb_ms = round((time.perf_counter() - started) * 1000, 1)
+        bytes_read += len(chunk)
+        if track:
+            digest.update(chunk)
+
+        if kind is None:
+            head = chunk.lstrip().removeprefix(b'\xef\xbb\xbf').lstrip()
+            if not head:
+                continue
+            if head.startswith(b'<'):
+                kind = "xml"
+            elif head[:1] in (b'{', b'[') or 'application/json' in content_type:
+                kind = "json"
+            else:
+                kind = "other"
+            chunk = head  # the XML parser rejects anything before <?xml ...?>
+
+        if kind == "xml":
+            try:
+                parser.feed(chunk)
+                for event, element in parser.read_events():
+                    if event == "start":
+                        name = local_name(element.tag)
+                        root = root or name
+                        path.append(name)
+                        continue
+                    name = path.pop()
+                    if layers is not None and name == "Name" and path and path[-1] == "Layer" and element.text:
+                        layers.add(element.text.strip())
+                    element.clear()  # keep full reads from building the whole tree
+            except ElementTree.ParseError as e:
+                error = e
+                break
+            if root is not None and not full:
+                break
+        elif kind == "json" and full:
+            if deep:
+                json_chunks.append(chunk)
+        else:
+            break
+
+        if bytes_read >= max_bytes:
+            truncated = True
+            break
+    else:
+        complete = True
+
+    if kind == "xml" and full and error is None and not truncated:
+        try:
+            parser.close()
+        except ElementTree.ParseError as e:
+            error = e
+
+    size = f"{bytes_read} bytes read, TTFB {ttfb_ms} ms"
+    if not bytes_read or kind is None:
+        status, message = 'down', f"WMS returned an empty response ({size})"
+    elif kind == "xml" and root is not None and 'Capabilities' in root:
+        if error is not None and deep:
+            status, message = 'degraded', f"WMS {root} document is malformed: {error} ({size})"
+        elif truncated and deep:
+            status, message = 'up', f"WMS GetCapabilities returned {root}, validated up to the {max_bytes} byte cap ({size})"
+        else:
+            layer_count = f", {len(layers)} layer(s)" if layers is not None and complete and error is None else ""
+            status, message = 'up', f"WMS GetCapabilities returned valid XML, root {root}{layer_count} ({size})"
+    elif kind == "xml" and root is not None:
+        status, message = 'degraded', f"WMS returned XML with root <{root}>, not a GetCapabilities document ({size})"
+    elif kind == "xml" and error is not None:
+        status, message = 'degraded', f"WMS returned XML that could not be parsed: {error} ({size})"
+    elif kind == "xml":
+        status, message = 'degraded', f"WMS returned XML with no root element within {max_bytes} bytes ({size})"
+    elif kind == "json" and not deep:
+        status, message = 'up', f"WMS GetCapabilities returned JSON ({size})"
+    elif kind == "json" and truncated:
+        status, message = 'degraded', f"WMS returned JSON larger than the {max_bytes} byte cap, not validated ({size})"
+    elif kind == "json":
+        try:
+            json.loads(b"".join(json_chunks))
+            status, message = 'up', f"WMS GetCapabilities returned valid JSON ({size})"
+        except ValueError:
+            status, message = 'down', f"WMS returned invalid JSON ({size})"
+    else:
+        status, message = 'down', f"WMS did not return valid XML or JSON response (got {content_type}, {size})"
+
+    tracked = track and complete and error is None
+    return {
+        "status": status,
+        "message": message,
+        "root": root,
+        "bytes": bytes_read,
+        "ttfb_ms": ttfb_ms,
+        "content_hash": digest.hexdigest() if tracked else None,
+        "layers": sorted(layers) if tracked and kind == "xml" else None,
+    }
+
+
+def load_capabilities_state(service_id: int):
+    """Last stored capabilities for a service, or None before anything was stored.
+
+    hash_due is set when the last hash is older than THREDDS_CHANGE_HASH_INTERVAL
+    (or there is none).
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT etag, last_modified, content_hash, layers,
+                       hashed_at IS NULL OR hashed_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                FROM thredds_capabilities
+                WHERE service_id = %s
+            """, (THREDDS_CHANGE_HASH_INTERVAL, service_id))
+            row = cur.fetchone()
+    if not row:
+        return None
+    return {"etag": row[0], "last_modified": row[1], "content_hash": row[2], "layers": row[3], "hash_due": row[4]}
+
+
+def has_validators(response_headers) -> bool:
+    return bool(response_headers.get("ETag") or response_headers.get("Last-Modified"))
+
+
+def should_hash(state, response_headers) -> bool:
+    """Whether to read a 200 to the end for its hash instead of stopping at the root.
+
+    Worth it when the server sent validators, since later checks get 304s,
+    and otherwise only for the first fetch and once per
+    THREDDS_CHANGE_HASH_INTERVAL.
+    """
+    return has_validators(response_headers) or state is None or state["hash_due"]
+
+
+def conditional_headers(state) -> dict:
+    """If-None-Match / If-Modified-Since for the stored validators"""
+    headers = {}
+    if state and state["etag"]:
+        headers["If-None-Match"] = state["etag"]
+    if state and state["last_modified"]:
+        headers["If-Modified-Since"] = state["last_modified"]
+    return headers
+
+
+def record_capabilities(service_id: int, state, response_headers, result: dict):
+    """Store the validators of a passing response, and its hash when it was read in full.
+
+    Without a hash (body over the cap, or not read to the end) the previous
+    hash and layers are kept. Returns the change recorded against the
+    previous document, as {"layers_added", "layers_removed", "added",
+    "removed"}, or None when either hash is missing or they match.
+    """
+    layers = result["layers"] or []
+    change = None
+    if state and state["content_hash"] and result["content_hash"] and state["content_hash"] != result["content_hash"]:
+        previous = set(state["layers"] or [])
+        added = sorted(set(layers) - previous)
+        removed = sorted(previous - set(layers))
+        change = {"layers_added": len(added), "layers_removed": len(removed), "added": added, "removed": removed}
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO thredds_capabilities
+                    (service_id, etag, last_modified, content_hash, layers, bytes, fetched_at, hashed_at, changed_at)
+                VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP,
+                        CASE WHEN %s THEN CURRENT_TIMESTAMP END, CURRENT_TIMESTAMP)
+                ON CONFLICT (service_id) DO UPDATE SET
+                    etag = EXCLUDED.etag,
+                    last_modified = EXCLUDED.last_modified,
+                    content_hash = COALESCE(EXCLUDED.content_hash, thredds_capabilities.content_hash),
+                    layers = CASE
+                        WHEN EXCLUDED.content_hash IS NULL THEN thredds_capabilities.layers ELSE EXCLUDED.layers
+                    END,
+                    bytes = EXCLUDED.bytes,
+                    fetched_at = EXCLUDED.fetched_at,
+                    hashed_at = COALESCE(EXCLUDED.hashed_at, thredds_capabilities.hashed_at),
+                    changed_at = CASE
+                        WHEN EXCLUDED.content_hash IS NOT NULL
+                             AND thredds_capabilities.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+                        THEN EXCLUDED.changed_at ELSE thredds_capabilities.changed_at
+                    END
+            """, (
+                service_id,
+                response_headers.get("ETag"),
+                response_headers.get("Last-Modified"),
+                result["content_hash"],
+                layers,
+                result["bytes"],
+                result["content_hash"] is not None,
+            ))
+            if change:
+                cur.execute("""
+                    INSERT INTO thredds_capability_changes
+                        (service_id, previous_hash, content_hash, layers_added, layers_removed, added, removed)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    service_id,
+                    state["content_hash"],
+                    result["content_hash"],
+                    change["layers_added"],
+                    change["layers_removed"],
+                    change["added"],
+                    change["removed"],
+                ))
+            conn.commit()
+    return change
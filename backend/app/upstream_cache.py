@@ -0,0 +1,104 @@
+"""
+Shared cache for upstream JSON documents (Ocean Middleware dataset/task lists)
+One download serves every check inside the TTL; concurrent callers share a
+single in-flight request and stale entries are revalidated with
+ETag/Last-Modified
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from app.http_client import HttpClient, http_client
+
+UPSTREAM_CACHE_TTL = float(os.getenv('UPSTREAM_CACHE_TTL', '60'))  # seconds a response is served without revalidation
+
+
+class CacheEntry:
+    """A cached response body with its validators"""
+
+    def __init__(self, data, etag=None, last_modified=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic()
+
+
+class UpstreamCache:
+    """TTL cache with single-flight fetches and conditional revalidation.
+
+    Cached documents are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl: float = UPSTREAM_CACHE_TTL, name: str = "upstream", client: HttpClient = http_client):
+        self.ttl = ttl
+        self.name = name  # upstream label for request metrics
+        self.client = client
+        self._entries = {}  # url -> CacheEntry
+        self._inflight = {}  # url -> Future of the request being made
+        self._lock = threading.Lock()
+
+    def get_json(self, url: str, timeout: float = 60, **request_kwargs):
+        """Return the JSON body for url, fetching at most once per TTL.
+
+        Raises requests.exceptions.RequestException or ValueError on failure,
+        which are never cached.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry and time.monotonic() - entry.fetched_at < self.ttl:
+                return entry.data
+            future = self._inflight.get(url)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[url] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            data = self._fetch(url, entry, timeout, request_kwargs)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+
+    def invalidate(self, url: str = None):
+        """Drop one cached URL, or everything"""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
+
+    def _fetch(self, url, entry, timeout, request_kwargs):
+        headers = dict(request_kwargs.pop('headers', None) or {})
+        if entry:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        response = self.client.get(url, upstream=self.name, headers=headers, timeout=timeout, **request_kwargs)
+        if response.status_code == 304 and entry:
+            entry.fetched_at = time.monotonic()
+            return entry.data
+
+        response.raise_for_status()
+        data = response.json()
+        with self._lock:
+            self._entries[url] = CacheEntry(
+                data,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+            )
+        return data
+
+
+# Global instance
+upstream_cache = UpstreamCache(name="ocean_middleware")
@@ -2,26 +2,36 @@
 """
 Monitoring Daemon - Handles all service monitoring in a single process
 """
-import time
 import os
 import sys
 import signal
 import logging
-import subprocess
-import requests
 import json
+import threading
+import time
 import urllib3
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
 import psycopg2
 import psycopg2.extras
-import psycopg2.pool
+from prometheus_client import start_http_server
 
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Import ocean service check functionality
-from app.monitor import ocean_service_check, populate_ocean_tasks_in_monitoring_table, check_dataset_service, check_thredds_service
+from app.monitor import check_ocean_services, populate_ocean_tasks_in_monitoring_table, check_dataset_service, check_dataset_services, check_cloud_services, check_thredds_service, record_result
+from app.result_sink import result_sink
+from app.db import get_connection_pool, close_connection_pool, DB_POOL_MAX
+from app.metrics import SCHEDULER_LAG, observe_check
+from app.http_client import http_client
+from app.models import DatabaseSchema
+from app.retention import purge_monitoring_logs
+from app.scheduler import CheckScheduler
+from app.probes import probe_engine, PROBE_PROTOCOLS
+from app.pinger import pinger
 
 # Setup logging
 logging.basicConfig(
@@ -34,85 +44,65 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Database configuration
-DB_CONFIG = {
-    'dbname': os.getenv('DB_NAME', 'monitoring_db'),
-    'user': os.getenv('DB_USER', 'gem_user'),
-    'password': os.getenv('DB_PASSWORD', 'P@ssword123'),
-    'host': os.getenv('DB_HOST', 'db'),
-    'port': int(os.getenv('DB_PORT', '5432'))
-}
-
-# DB_CONFIG = {
-#     'dbname': os.getenv('DB_NAME', 'monitoring_db'),
-#     'user': os.getenv('DB_USER', 'postgres'),
-#     'password': os.getenv('DB_PASSWORD', 'postgres'),
-#     'host': os.getenv('DB_HOST', 'localhost'),
-#     'port': int(os.getenv('DB_PORT', '5432'))
-# }
+# Check executor configuration
+MAX_WORKERS = int(os.getenv('MONITOR_MAX_WORKERS', '8'))  # concurrent checks per cycle
+CYCLE_DEADLINE = float(os.getenv('MONITOR_CYCLE_DEADLINE', '120'))  # seconds before a running check is logged as overdue
+RELOAD_INTERVAL = float(os.getenv('MONITOR_RELOAD_INTERVAL', '30'))  # seconds between service set change checks
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv('MONITOR_PARTITION_MAINTENANCE_INTERVAL', '86400'))  # seconds
+RETENTION_INTERVAL = float(os.getenv('MONITOR_RETENTION_INTERVAL', '86400'))  # seconds between log retention runs
+METRICS_PORT = int(os.getenv('MONITOR_METRICS_PORT', '9108'))  # Prometheus /metrics listener, 0 disables
 
 
 class MonitoringDaemon:
     def __init__(self):
         """Initialize the monitoring daemon"""
         self.running = True
-        self.service_schedules = {}  # service_id -> next_run_time
+        self.stop_event = threading.Event()  # Wakes the main loop on shutdown
+        self.scheduler = CheckScheduler()
+        self.services_revision = None  # Last seen monitored_services_revision
+        self.next_reload_check = None
         self.last_ocean_population = None  # Track when we last populated ocean tasks
+        self.last_partition_maintenance = None  # Track when we last created monitoring_logs partitions
+        self.last_retention_run = None  # Track when we last started a log retention run
+        self.retention_thread = None
+        
+        # Bounded worker pool for running checks concurrently
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="check")
+        # Probe results are recorded on their own pool so they never queue behind slow checks
+        self.record_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="record")
+        self.in_flight = set()  # service_ids with a check currently queued or running
+        self.in_flight_lock = threading.Lock()
+        self.pending_probes = set()  # probe engine futures not yet recorded
+        self.outstanding = {}  # check/batch future -> (services, submitted at), until it finishes
+        self.reported_overdue = set()  # outstanding futures already logged as overdue
         
         # Set up signal handlers
         signal.signal(signal.SIGTERM, self.signal_handler)
         signal.signal(signal.SIGINT, self.signal_handler)
         
-        # Initialize connection pool
-        try:
-            self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-                minconn=1,
-                maxconn=5,
-                **DB_CONFIG
-            )
-            logger.info("Database connection pool initialized")
-        except Exception as e:
-            logger.error(f"Error initializing connection pool: {e}")
-            self.connection_pool = None
+        # Shared app.db pool, sized for the check workers plus the main loop and result sink
+        self.connection_pool = get_connection_pool(maxconn=max(DB_POOL_MAX, MAX_WORKERS + 2))
+        logger.info(f"Database connection pool initialized (max {self.connection_pool.maxconn})")
     
     def signal_handler(self, signum, frame):
         """Handle shutdown signals"""
         logger.info(f"Received signal {signum}, shutting down...")
         self.running = False
-        if self.connection_pool:
-            self.connection_pool.closeall()
+        self.stop_event.set()
     
     def get_connection(self):
-        """Get database connection from pool"""
-        if self.connection_pool:
-            try:
-                return self.connection_pool.getconn()
-            except psycopg2.pool.PoolError as e:
-                logger.error(f"Connection pool exhausted: {e}")
-                return psycopg2.connect(**DB_CONFIG)
-        else:
-            return psycopg2.connect(**DB_CONFIG)
+        """Get database connection from pool, waiting up to DB_POOL_ACQUIRE_TIMEOUT"""
+        return self.connection_pool.getconn()
     
     def return_connection(self, conn):
         """Return connection to pool"""
-        if self.connection_pool:
-            try:
-                if conn and not conn.closed:
-                    self.connection_pool.putconn(conn)
-            except Exception as e:
-                logger.error(f"Error returning connection to pool: {e}")
-                try:
-                    conn.close()
-                except:
-                    pass
-        else:
-            try:
-                conn.close()
-            except:
-                pass
+        try:
+            self.connection_pool.putconn(conn)
+        except Exception as e:
+            logger.error(f"Error returning connection to pool: {e}")
     
-    def get_active_services(self) -> List[Dict]:
-        """Get all active services from database"""
+    def get_active_services(self) -> Optional[List[Dict]]:
+        """Get all active services from database, or None if the query failed"""
         conn = None
         try:
             conn = self.get_connection()
@@ -128,11 +118,47 @@ class MonitoringDaemon:
                 return cur.fetchall()
         except Exception as e:
             logger.error(f"Error fetching services: {e}")
-            return []
+            return None
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def get_services_revision(self) -> Optional[int]:
+        """Get the service set revision, or None if it cannot be read"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                cur.execute("SELECT revision FROM monitored_services_revision WHERE id = 1")
+                result = cur.fetchone()
+                return result[0] if result else None
+        except Exception as e:
+            logger.debug(f"Could not read services revision: {e}")
+            if conn:
+                conn.rollback()
+            return None
         finally:
             if conn:
                 self.return_connection(conn)
     
+    def refresh_services(self, current_time: datetime):
+        """Reload the service set into the scheduler when it has changed"""
+        revision = self.get_services_revision()
+        if revision is not None and revision == self.services_revision:
+            return
+        
+        services = self.get_active_services()
+        if services is None:
+            return  # keep the current schedule until the database is reachable
+        
+        added, removed = self.scheduler.sync(services, current_time)
+        self.services_revision = revision
+        for service_id in added:
+            logger.info(f"Added service {service_id} to monitoring schedule")
+        for service_id in removed:
+            logger.info(f"Removed service {service_id} from monitoring schedule")
+        logger.info(f"Loaded {len(services)} active services (revision {revision})")
+    
     def calculate_next_run_time(self, service: Dict, current_time: datetime) -> datetime:
         """Calculate when the service should run next based on its interval"""
         interval_type = service['interval_type']
@@ -158,110 +184,10 @@ class MonitoringDaemon:
         else:
             return current_time + timedelta(minutes=1)
     
-    def get_cloud_token(self):
-        """Get the cloud monitoring token from the database"""
-        conn = None
-        try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                cur.execute("SELECT configuration FROM dashboard_configs WHERE name = 'cloud-monitoring.corp.spc.int'")
-                result = cur.fetchone()
-                if result:
-                    return result[0]
-        except Exception as e:
-            logger.error(f"Error getting cloud token: {e}")
-        finally:
-            if conn:
-                self.return_connection(conn)
-        return None
-
-    def check_cloud_service(self, service: Dict):
-        """Check a Server Cloud service"""
-        service_id = service["id"]
-        service_name = service["name"]
-        
-        token = self.get_cloud_token()
-        if not token:
-            self.log_monitoring_result(service_id, "unknown", "No cloud token found in database", "Cloud API Check")
-            self.update_service_status(service_id, "unknown")
-            return
-
-        url = "https://cloud-monitoring.corp.spc.int/api/collections/systems/records"
-        params = {
-            "page": 1,
-            "perPage": 1,
-            "filter": f"name='{service_name}'"
-        }
-        headers = {
-            "Authorization": f"Bearer {token}"
-        }
-
-        try:
-            response = requests.get(url, params=params, headers=headers, verify=False, timeout=10)
-            
-            if response.status_code != 200:
-                self.log_monitoring_result(service_id, "unknown", f"API Error: {response.status_code} - {response.text}", f"GET {url}")
-                self.update_service_status(service_id, "unknown")
-                return
-
-            data = response.json()
-            items = data.get("items", [])
-            
-            if not items:
-                self.log_monitoring_result(service_id, "unknown", f"Service '{service_name}' not found in cloud monitoring", f"GET {url}")
-                self.update_service_status(service_id, "unknown")
-                return
-
-            item = items[0]
-            status = item.get("status", "unknown")
-            updated_at_str = item.get("updated")
-            
-            # Log the result
-            self.log_monitoring_result(service_id, status, f"Cloud status: {status}, Last updated: {updated_at_str}", f"GET {url}")
-            
-            # Update service status and updated_at time
-            conn = None
-            try:
-                conn = self.get_connection()
-                with conn.cursor() as cur:
-                    # We need to update updated_at specifically from the cloud data
-                    # The standard update_service_status sets updated_at to NOW(), which is fine for local check time
-                    # But user requested "created and updated at would come from updated"
-                    # However, for monitoring logs, we usually want to know when WE checked it.
-                    # But the user said: "update the status and updated: ..."
-                    
-                    # Let's stick to the standard update first, but maybe we should also update the record with the cloud's updated time?
-                    # The user said: "all we need to do is update the status and updated"
-                    
-                    success = status == "up"
-                    cur.execute("""
-                        UPDATE monitored_services
-                        SET
-                            last_status = %s,
-                            success_count = success_count + %s,
-                            failure_count = failure_count + %s,
-                            updated_at = %s
-                        WHERE id = %s
-                    """, (status, 1 if success else 0, 0 if success else 1, updated_at_str, service_id))
-                    conn.commit()
-            except Exception as e:
-                logger.error(f"Error updating cloud service status {service_id}: {e}")
-            finally:
-                if conn:
-                    self.return_connection(conn)
-                    
-            logger.info(f"Checked cloud service {service_id} ({service_name}): {status}")
-
-        except Exception as e:
-            logger.error(f"Error checking cloud service {service_id}: {e}")
-            self.log_monitoring_result(service_id, "unknown", f"Exception: {str(e)}", f"GET {url}")
-            self.update_service_status(service_id, "unknown")
-
     def check_service(self, service: Dict):
         """Check a single service"""
         protocol = service["protocol"]
         ip = service["ip_address"]
-        port = str(service["port"])
         service_id = service["id"]
         service_name = service["name"]
         
@@ -269,7 +195,7 @@ class MonitoringDaemon:
         # We check the 'type' field if it exists in the service dict (it was added to the query in get_active_services)
         service_type = service.get("type")
         if service_type == "Server Cloud":
-            self.check_cloud_service(service)
+            self.run_batch(self.run_cloud_batch, [service])
             return
         
         # Check for datasets type
@@ -289,94 +215,130 @@ class MonitoringDaemon:
 
         # Check if this is an ocean middleware service
         if "ocean-middleware.spc.int/middleware/api/" in ip:
-            self.check_ocean_service(service)
+            self.run_batch(self.run_ocean_batch, [service])
             return
 
-        # Build command for regular services
-        if protocol == "ping":
-            command = ["ping", "-c", "2", ip]
-        elif protocol == "http":
-            command = ["curl", "-Is", f"http://{ip}:{port}"]
-        elif protocol == "tcp":
-            command = ["nc", "-zv", ip, port]
-        else:
-            self.log_monitoring_result(service_id, "down", f"Unsupported protocol: {protocol}", "")
-            self.update_service_status(service_id, "down")
+        # tcp/http/https run in-process on the probe engine
+        if protocol in PROBE_PROTOCOLS:
+            result = probe_engine.probe(protocol, ip, service["port"])
+            record_result(service_id, result["status"], result["output"], result["command"], latency_ms=result["latency_ms"])
+            logger.info(f"Checked service {service_id} ({service_name}): {result['status']}")
             return
 
-        # Retry loop
-        status = "down"
-        output = ""
-        for attempt in range(3):
-            try:
-                result = subprocess.run(command, capture_output=True, text=True, timeout=10)
-                if result.returncode == 0:
-                    status = "up"
-                    output = result.stdout or result.stderr
-                    break
-                else:
-                    output = result.stderr or "Command failed"
-            except subprocess.TimeoutExpired:
-                output = "Timeout occurred"
-            except Exception as e:
-                output = str(e)
-            time.sleep(1)
+        # ping goes through the batched ICMP pinger
+        if protocol == "ping":
+            self.run_batch(self.run_ping_batch, [service])
+            return
 
-        self.log_monitoring_result(service_id, status, output, " ".join(command))
-        self.update_service_status(service_id, status)
-        logger.info(f"Checked service {service_id} ({service_name}): {status}")
+        record_result(service_id, "down", f"Unsupported protocol: {protocol}", "")
     
-    def log_monitoring_result(self, service_id: int, status: str, message: str, command: str):
-        """Log monitoring result to database"""
-        full_message = f"Command: {command}\nResult: {message[:450]}"
-        conn = None
+    def run_ping_batch(self, services: List[Dict]):
+        """Ping every service in one ICMP batch and record each result"""
+        results = pinger.ping_many([service["ip_address"] for service in services], retries=3)
+        for service in services:
+            result = results[service["ip_address"]]
+            record_result(service["id"], result["status"], result["output"], result["command"], latency_ms=result["latency_ms"])
+            logger.info(f"Checked service {service['id']} ({service['name']}): {result['status']}")
+    
+    def run_dataset_batch(self, services: List[Dict]):
+        """Check every due datasets service from one task list download"""
+        results = check_dataset_services(services)
+        for service, result in zip(services, results):
+            logger.info(f"Checked dataset service {service['id']} ({service['name']}): {result['status']}")
+    
+    def run_ocean_batch(self, services: List[Dict]):
+        """Check every due Ocean Portal task service from one evaluation of all tasks"""
+        results = check_ocean_services(services)
+        for service, result in zip(services, results):
+            logger.info(f"Checked ocean service {service['id']} ({service['name']}): {result['status']}")
+    
+    def run_cloud_batch(self, services: List[Dict]):
+        """Check every due Server Cloud service from one pull of the cloud systems list"""
+        results = check_cloud_services(services)
+        for service, result in zip(services, results):
+            logger.info(f"Checked cloud service {service['id']} ({service['name']}): {result['status']}")
+    
+    def run_batch(self, runner, services: List[Dict]):
+        """Run a batch checker on a worker thread"""
+        started = time.perf_counter()
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO monitoring_logs (service_id, status, message)
-                    VALUES (%s, %s, %s)
-                """, (service_id, status, full_message))
-                conn.commit()
+            runner(services)
         except Exception as e:
-            logger.error(f"Error logging result for service {service_id}: {e}")
+            logger.error(f"Error running {runner.__name__} for {len(services)} service(s): {e}")
         finally:
-            if conn:
-                self.return_connection(conn)
+            # Every service in the batch waited for the whole batch
+            elapsed = time.perf_counter() - started
+            for service in services:
+                observe_check(service, elapsed)
+            with self.in_flight_lock:
+                for service in services:
+                    self.in_flight.discard(service["id"])
     
-    def update_service_status(self, service_id: int, status: str):
-        """Update service status in database"""
-        success = status == "up"
-        conn = None
+    def batch_runner(self, service: Dict):
+        """Batch checker for services that are checked together each cycle, or None"""
+        if service.get("type") == "datasets":
+            return self.run_dataset_batch
+        if service.get("type") == "Server Cloud":
+            return self.run_cloud_batch
+        if service["protocol"] == "ping" and self.is_plain_service(service):
+            return self.run_ping_batch
+        if self.is_ocean_service(service):
+            return self.run_ocean_batch
+        return None
+    
+    def is_plain_service(self, service: Dict) -> bool:
+        """Whether a service is checked by its protocol rather than by its type"""
+        return (
+            service.get("type") not in ("Server Cloud", "datasets", "thredds")
+            and "ocean-middleware.spc.int/middleware/api/" not in service["ip_address"]
+        )
+    
+    def is_ocean_service(self, service: Dict) -> bool:
+        """Whether a service is an Ocean Portal task, checked by check_ocean_services"""
+        return (
+            service.get("type") not in ("Server Cloud", "datasets", "thredds")
+            and service["protocol"] != "external"
+            and "ocean-middleware.spc.int/middleware/api/" in service["ip_address"]
+        )
+    
+    def is_probe_service(self, service: Dict) -> bool:
+        """Whether a service is a plain tcp/http/https check handled by the probe engine"""
+        return service["protocol"] in PROBE_PROTOCOLS and self.is_plain_service(service)
+    
+    def submit_probe(self, service: Dict) -> Future:
+        """Start a probe on the probe engine without tying up a worker thread"""
+        started = time.perf_counter()
+        future = probe_engine.submit(service["protocol"], service["ip_address"], service["port"])
+        with self.in_flight_lock:
+            self.pending_probes.add(future)
+        future.add_done_callback(partial(self.on_probe_done, service, started))
+        return future
+    
+    def on_probe_done(self, service: Dict, started: float, future: Future):
+        """Hand a finished probe to the record pool; runs on the probe loop thread"""
+        observe_check(service, time.perf_counter() - started)
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE monitored_services
-                    SET
-                        last_status = %s,
-                        success_count = success_count + %s,
-                        failure_count = failure_count + %s,
-                        updated_at = NOW()
-                    WHERE id = %s
-                """, (status, 1 if success else 0, 0 if success else 1, service_id))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Error updating status for service {service_id}: {e}")
-        finally:
-            if conn:
-                self.return_connection(conn)
+            self.record_executor.submit(self.record_probe_result, service, future)
+        except RuntimeError:
+            # Record pool already shut down during drain
+            self.record_probe_result(service, future)
     
-    def check_ocean_service(self, service: Dict):
-        """Check ocean middleware services using the ocean_service_check function"""
+    def record_probe_result(self, service: Dict, future: Future):
+        """Write a finished probe's result to the database"""
+        service_id = service["id"]
         try:
-            result = ocean_service_check(service)
-            logger.info(f"Checked ocean service {service['id']} ({service['name']}): {result['status']}")
+            if future.cancelled():
+                logger.warning(f"Probe for service {service_id} was cancelled")
+                return
+            result = future.result()
+            record_result(service_id, result["status"], result["output"], result["command"], latency_ms=result["latency_ms"])
+            logger.info(f"Checked service {service_id} ({service['name']}): {result['status']}")
         except Exception as e:
-            logger.error(f"Error checking ocean service {service['id']}: {e}")
-            # Log the error to monitoring_logs
-            self.log_monitoring_result(service['id'], "unknown", f"Error: {str(e)}", "Ocean Portal API check")
-            self.update_service_status(service['id'], "unknown")
+            logger.error(f"Error recording probe for service {service_id}: {e}")
+        finally:
+            with self.in_flight_lock:
+                self.in_flight.discard(service_id)
+                self.pending_probes.discard(future)
     
     def check_dataset_service(self, service: Dict):
         """Check dataset services using the check_dataset_service function"""
@@ -385,8 +347,7 @@ class MonitoringDaemon:
             logger.info(f"Checked dataset service {service['id']} ({service['name']}): {result['status']}")
         except Exception as e:
             logger.error(f"Error checking dataset service {service['id']}: {e}")
-            self.log_monitoring_result(service['id'], "unknown", f"Error: {str(e)}", "Dataset API check")
-            self.update_service_status(service['id'], "unknown")
+            record_result(service['id'], "unknown", f"Error: {str(e)}", "Dataset API check")
     
     def check_thredds_service(self, service: Dict):
         """Check THREDDS WMS services using the check_thredds_service function"""
@@ -395,9 +356,88 @@ class MonitoringDaemon:
             logger.info(f"Checked THREDDS service {service['id']} ({service['name']}): {result['status']}")
         except Exception as e:
             logger.error(f"Error checking THREDDS service {service['id']}: {e}")
-            self.log_monitoring_result(service['id'], "unknown", f"Error: {str(e)}", "THREDDS WMS check")
-            self.update_service_status(service['id'], "unknown")
+            record_result(service['id'], "unknown", f"Error: {str(e)}", "THREDDS WMS check")
     
+    def run_check(self, service: Dict):
+        """Run a single check on a worker thread"""
+        started = time.perf_counter()
+        try:
+            self.check_service(service)
+        except Exception as e:
+            logger.error(f"Error checking service {service['id']}: {e}")
+        finally:
+            observe_check(service, time.perf_counter() - started)
+            with self.in_flight_lock:
+                self.in_flight.discard(service['id'])
+
+    def run_checks(self, services: List[Dict]):
+        """Start due checks concurrently without waiting for them.
+        
+        Each check clears its in_flight entry when it finishes, so the main
+        loop keeps scheduling while slow checks run.
+        """
+        futures = {}  # future -> services it covers
+        batches = {}  # batch runner -> services
+        for service in services:
+            service_id = service['id']
+            with self.in_flight_lock:
+                if service_id in self.in_flight:
+                    logger.warning(f"Service {service_id} ({service['name']}) is still being checked, skipping this run")
+                    continue
+                self.in_flight.add(service_id)
+            runner = self.batch_runner(service)
+            if self.is_probe_service(service):
+                futures[self.submit_probe(service)] = [service]
+            elif runner:
+                batches.setdefault(runner, []).append(service)
+            else:
+                futures[self.executor.submit(self.run_check, service)] = [service]
+        
+        for runner, batch in batches.items():
+            futures[self.executor.submit(self.run_batch, runner, batch)] = batch
+
+        submitted_at = time.monotonic()
+        with self.in_flight_lock:
+            for future, covered in futures.items():
+                self.outstanding[future] = (covered, submitted_at)
+        for future in futures:
+            future.add_done_callback(self.on_check_done)
+
+    def on_check_done(self, future: Future):
+        with self.in_flight_lock:
+            self.outstanding.pop(future, None)
+            self.reported_overdue.discard(future)
+
+    def report_overdue(self):
+        """Log checks running longer than CYCLE_DEADLINE, once each; they are left to finish"""
+        now = time.monotonic()
+        with self.in_flight_lock:
+            overdue = [
+                future for future, (_, submitted_at) in self.outstanding.items()
+                if now - submitted_at > CYCLE_DEADLINE and future not in self.reported_overdue
+            ]
+            self.reported_overdue.update(overdue)
+            service_ids = [service['id'] for future in overdue for service in self.outstanding[future][0]]
+        if overdue:
+            logger.warning(f"{len(overdue)} check(s) still running after {CYCLE_DEADLINE:g}s: {service_ids}")
+
+    def shutdown(self):
+        """Drain running checks and release resources"""
+        logger.info("Waiting for running checks to finish...")
+        with self.in_flight_lock:
+            pending = list(self.pending_probes)
+        wait(pending)
+        # Finished probes are always recorded; only checks that have not started are cancelled
+        self.record_executor.shutdown(wait=True)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.retention_thread is not None:
+            self.retention_thread.join()
+        probe_engine.close()
+        http_client.close()
+        logger.info(f"Flushing {result_sink.pending()} buffered result(s)...")
+        result_sink.close()
+        close_connection_pool()
+
     def populate_ocean_tasks(self):
         """Populate ocean tasks in the monitoring table"""
         try:
@@ -416,10 +456,58 @@ class MonitoringDaemon:
         time_since_last = datetime.now() - self.last_ocean_population
         return time_since_last.total_seconds() >= 3600  # 1 hour
     
+    def maintain_partitions(self):
+        """Create upcoming monitoring_logs partitions (no-op for an unpartitioned table)"""
+        try:
+            created = DatabaseSchema.maintain_monitoring_logs_partitions()
+            if created:
+                logger.info(f"Created monitoring_logs partitions: {', '.join(created)}")
+        except Exception as e:
+            logger.error(f"Error maintaining monitoring_logs partitions: {e}")
+        self.last_partition_maintenance = datetime.now()
+    
+    def should_maintain_partitions(self) -> bool:
+        """Check if partition maintenance is due"""
+        if self.last_partition_maintenance is None:
+            return True
+        
+        time_since_last = datetime.now() - self.last_partition_maintenance
+        return time_since_last.total_seconds() >= PARTITION_MAINTENANCE_INTERVAL
+    
+    def run_retention(self):
+        """Apply the monitoring_logs retention policy; runs on its own thread"""
+        try:
+            report = purge_monitoring_logs(stop_event=self.stop_event)
+            deleted = sum(report["rows_deleted"].values())
+            logger.info(
+                f"Log retention removed {len(report['partitions_dropped'])} partition(s) and {deleted} row(s) "
+                f"in {report['duration_seconds']}s: {report['rows_deleted']}"
+                + ("" if report["completed"] else " (incomplete)")
+            )
+        except Exception as e:
+            logger.error(f"Error running log retention: {e}")
+    
+    def should_run_retention(self) -> bool:
+        """Check if a retention run is due and none is still going"""
+        if self.retention_thread is not None and self.retention_thread.is_alive():
+            return False
+        if self.last_retention_run is None:
+            return True
+        
+        time_since_last = datetime.now() - self.last_retention_run
+        return time_since_last.total_seconds() >= RETENTION_INTERVAL
+    
     def run(self):
         """Main daemon loop"""
         logger.info("Starting monitoring daemon...")
         
+        # Check results are buffered and written in batches from here on
+        result_sink.start()
+        
+        if METRICS_PORT:
+            start_http_server(METRICS_PORT)
+            logger.info(f"Serving Prometheus metrics on port {METRICS_PORT}")
+        
         # Populate ocean tasks on startup
         # self.populate_ocean_tasks()
         
@@ -431,57 +519,46 @@ class MonitoringDaemon:
                 # if self.should_populate_ocean_tasks():
                 #     self.populate_ocean_tasks()
                 
-                services = self.get_active_services()
-                
-                # Initialize schedules for new services
-                for service in services:
-                    service_id = service['id']
-                    if service_id not in self.service_schedules:
-                        self.service_schedules[service_id] = current_time
-                        logger.info(f"Added service {service_id} ({service['name']}) to monitoring schedule")
+                if self.should_maintain_partitions():
+                    self.maintain_partitions()
                 
-                # Check which services need to be monitored
-                services_to_check = []
-                next_check_time = None
+                # Deletes are throttled, so retention runs beside the checks rather than blocking them
+                if self.should_run_retention():
+                    self.last_retention_run = current_time
+                    self.retention_thread = threading.Thread(target=self.run_retention, name="log-retention", daemon=True)
+                    self.retention_thread.start()
                 
-                for service in services:
-                    service_id = service['id']
-                    next_run = self.service_schedules.get(service_id)
-                    
-                    if next_run and current_time >= next_run:
-                        services_to_check.append(service)
-                        self.service_schedules[service_id] = self.calculate_next_run_time(service, current_time)
-                    elif next_run:
-                        if next_check_time is None or next_run < next_check_time:
-                            next_check_time = next_run
+                # Reload the service set only when its revision moves
+                if self.next_reload_check is None or current_time >= self.next_reload_check:
+                    self.refresh_services(current_time)
+                    self.next_reload_check = current_time + timedelta(seconds=RELOAD_INTERVAL)
                 
-                # Check services that are due
+                # Pop due services off the heap and reschedule them
+                due = self.scheduler.pop_due_with_times(current_time)
+                services_to_check = [service for service, _ in due]
+                for _, scheduled_time in due:
+                    SCHEDULER_LAG.observe(max((current_time - scheduled_time).total_seconds(), 0))
                 for service in services_to_check:
-                    try:
-                        self.check_service(service)
-                    except Exception as e:
-                        logger.error(f"Error checking service {service['id']}: {e}")
+                    self.scheduler.schedule(service['id'], self.calculate_next_run_time(service, current_time))
                 
-                # Remove schedules for services that are no longer active
-                active_service_ids = {s['id'] for s in services}
-                for service_id in list(self.service_schedules.keys()):
-                    if service_id not in active_service_ids:
-                        del self.service_schedules[service_id]
-                        logger.info(f"Removed service {service_id} from monitoring schedule")
+                # Check services that are due
+                self.run_checks(services_to_check)
+                self.report_overdue()
                 
-                # Adaptive sleep
-                if next_check_time:
-                    sleep_seconds = min((next_check_time - current_time).total_seconds(), 60)
-                    sleep_seconds = max(sleep_seconds, 1)
-                else:
-                    sleep_seconds = 60
+                # Sleep until the next deadline or service set check, whichever is first
+                wake_time = self.next_reload_check
+                next_check_time = self.scheduler.next_run_time()
+                if next_check_time and next_check_time < wake_time:
+                    wake_time = next_check_time
+                sleep_seconds = max((wake_time - datetime.now()).total_seconds(), 0)
                 
-                time.sleep(sleep_seconds)
+                self.stop_event.wait(sleep_seconds)
                 
             except Exception as e:
                 logger.error(f"Error in main loop: {e}")
-                time.sleep(30)
+                self.stop_event.wait(30)
         
+        self.shutdown()
         logger.info("Monitoring daemon stopped")
 
 def cleanup():
@@ -532,6 +609,7 @@ def main():
     logger.info("Starting monitoring daemon...")
     daemon = MonitoringDaemon()
     daemon.run()
+    cleanup()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -12,7 +12,7 @@ import {
 } from '@mdi/js';
 import { utilityApi } from '../services/api';
 
-const EventLogPanel = ({ refreshTrigger = 0, isCollapsed, onToggleCollapse }) => {
+const EventLogPanel = ({ refreshTrigger = 0, live = false, isCollapsed, onToggleCollapse }) => {
   const [events, setEvents] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -42,7 +42,9 @@ const response = await fetch(`${process.env.REACT_APP_API_URL || 'https://opmthr
   },
   body: JSON.stringify({
     start_time: startTime.toISOString(),
-    end_time: endTime.toISOString()
+    end_time: endTime.toISOString(),
+    limit: 50, // only the 50 most recent are shown
+    message_chars: 500 // only the first lines are displayed
   })
 });
       
@@ -86,7 +88,8 @@ const response = await fetch(`${process.env.REACT_APP_API_URL || 'https://opmthr
 
   useEffect(() => {
     let interval;
-    if (autoRefresh && !isCollapsed) {
+    // While the dashboard's live stream is up, refreshTrigger already follows new logs
+    if (autoRefresh && !isCollapsed && !live) {
       interval = setInterval(() => {
         console.log('Auto-refresh triggered'); // Debug log
         fetchEvents();
@@ -98,7 +101,7 @@ const response = await fetch(`${process.env.REACT_APP_API_URL || 'https://opmthr
         clearInterval(interval);
       }
     };
-  }, [autoRefresh, isCollapsed, fetchEvents]);
+  }, [autoRefresh, isCollapsed, live, fetchEvents]);
 
   const getEventIcon = (status) => {
     switch (status) {
@@ -1,5 +1,5 @@
 // Updated Dashboard.js with EventLogPanel integration
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { servicesApi, monitoringApi, utilityApi } from '../services/api';
 import { useTheme } from '../contexts/ThemeContext';
 import ThemeToggle from '../components/ThemeToggle';
@@ -44,6 +44,10 @@ function Dashboard() {
   const [groupingPreferences, setGroupingPreferences] = useState({});
   const [expandedGroups, setExpandedGroups] = useState(new Set());
   const [refreshInterval, setRefreshInterval] = useState(30);
+  const lastSyncRef = useRef(null); // server_time of the last services poll
+  const syncTimerRef = useRef(null);
+  const [liveConnected, setLiveConnected] = useState(false);
+  const [monitorProgress, setMonitorProgress] = useState(null); // { done, total } while "Monitor All" runs
 
   useEffect(() => {
     checkApiStatus();
@@ -53,16 +57,50 @@ function Dashboard() {
     fetchRefreshInterval();
   }, []);
 
-  // Auto-refresh effect
+  // Live updates: status changes are applied as they arrive, then counts are
+  // caught up with one delta fetch per burst of events
   useEffect(() => {
-    if (!refreshInterval || refreshInterval <= 0) return;
+    const scheduleSync = () => {
+      if (syncTimerRef.current) return;
+      syncTimerRef.current = setTimeout(() => {
+        syncTimerRef.current = null;
+        fetchServices(true);
+      }, 1000);
+    };
+
+    const source = monitoringApi.streamEvents();
+    source.onopen = () => setLiveConnected(true);
+    source.onerror = () => setLiveConnected(false); // EventSource reconnects on its own
+
+    source.addEventListener('status', (e) => {
+      const event = JSON.parse(e.data);
+      setServices(prev => prev.map(service => (
+        service.id === event.service_id
+          ? { ...service, last_status: event.status, updated_at: event.updated_at || service.updated_at }
+          : service
+      )));
+      scheduleSync();
+    });
+    source.addEventListener('log', scheduleSync);
+    source.addEventListener('resync', scheduleSync);
+
+    return () => {
+      source.close();
+      clearTimeout(syncTimerRef.current);
+      syncTimerRef.current = null;
+    };
+  }, []);
+
+  // Auto-refresh effect, only while the live stream is down
+  useEffect(() => {
+    if (liveConnected || !refreshInterval || refreshInterval <= 0) return;
 
     const intervalId = setInterval(() => {
       fetchServices(true);
     }, refreshInterval * 1000);
 
     return () => clearInterval(intervalId);
-  }, [refreshInterval]);
+  }, [refreshInterval, liveConnected]);
 
   const fetchRefreshInterval = async () => {
     try {
@@ -100,8 +138,27 @@ function Dashboard() {
     if (!isBackground) setLoading(true);
     setError(null);
     try {
-      const data = await servicesApi.getAll();
-      setServices(data || []);
+      // Background refreshes only fetch services changed since the last poll
+      if (isBackground && lastSyncRef.current) {
+        const delta = await servicesApi.getChangedSince(lastSyncRef.current);
+        lastSyncRef.current = delta.server_time;
+        const changed = delta.services || [];
+        setServices(prev => {
+          const byId = new Map(prev.map(service => [service.id, service]));
+          changed.forEach(service => byId.set(service.id, service));
+          return delta.ids.map(id => byId.get(id)).filter(Boolean);
+        });
+        if (changed.length > 0) {
+          setEventRefreshTrigger(prev => prev + 1);
+        }
+        return;
+      }
+
+      // Changed rows come back by id; delta.ids carries the dashboard order
+      const delta = await servicesApi.getChangedSince('1970-01-01T00:00:00');
+      lastSyncRef.current = delta.server_time;
+      const byId = new Map((delta.services || []).map(service => [service.id, service]));
+      setServices(delta.ids.map(id => byId.get(id)).filter(Boolean));
       // Trigger event log refresh when services are updated
       setEventRefreshTrigger(prev => prev + 1);
     } catch (err) {
@@ -115,15 +172,25 @@ function Dashboard() {
   const handleMonitorAll = async () => {
     try {
       setLoading(true);
-      await monitoringApi.monitorAll();
+      setMonitorProgress({ done: 0, total: services.length });
+      // Each result is shown as soon as its check finishes
+      const results = await monitoringApi.monitorAll((result) => {
+        setMonitorProgress(prev => ({ ...prev, done: prev.done + 1 }));
+        if (result.status === 'timeout') return;
+        setServices(prev => prev.map(service => (
+          service.id === result.service_id ? { ...service, last_status: result.status } : service
+        )));
+      });
       await fetchServices();
       // Trigger event log refresh after monitoring
       setEventRefreshTrigger(prev => prev + 1);
-      alert('Monitoring completed!');
+      const timedOut = results.filter(result => result.status === 'timeout').length;
+      alert(timedOut ? `Monitoring completed, ${timedOut} check(s) timed out` : 'Monitoring completed!');
     } catch (err) {
       console.error('Monitoring error:', err);
       alert(`Monitoring failed: ${err.output || err.message || 'Unknown error'}`);
     } finally {
+      setMonitorProgress(null);
       setLoading(false);
     }
   };
@@ -304,7 +371,7 @@ function Dashboard() {
               {loading ? 'Loading...' : 'Refresh Services'}
             </button>
             <button onClick={handleMonitorAll} disabled={loading} className="btn btn-secondary">
-              Monitor All Services
+              {monitorProgress ? `Checking... ${monitorProgress.done}/${monitorProgress.total}` : 'Monitor All Services'}
             </button>
           </div>
 
@@ -588,6 +655,7 @@ function Dashboard() {
       {/* Event Log Sidebar */}
       <EventLogPanel
         refreshTrigger={eventRefreshTrigger}
+        live={liveConnected}
         isCollapsed={sidebarCollapsed}
         onToggleCollapse={handleToggleSidebar}
       />
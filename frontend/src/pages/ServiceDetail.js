@@ -1,7 +1,7 @@
 // src/pages/ServiceDetail.js
 import React, { useEffect, useState } from 'react';
 import { useLocation, useParams } from 'react-router-dom';
-import { monitoringApi } from '../services/api';
+import { monitoringApi, servicesApi } from '../services/api';
 import { useTheme } from '../contexts/ThemeContext';
 import ThemeToggle from '../components/ThemeToggle';
 
@@ -30,6 +30,18 @@ function ServiceDetail() {
   const [endTime, setEndTime] = useState('');
   const [logs, setLogs] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [uptime, setUptime] = useState(null);
+
+  const fetchUptime = async () => {
+    try {
+      // Last 30 days by day, read from the rollups rather than raw logs
+      const data = await servicesApi.getUptime(id, { bucket: 'day' });
+      setUptime(data);
+    } catch (err) {
+      console.error('Failed to fetch uptime', err);
+      setUptime(null);
+    }
+  };
 
   const fetchLogs = async () => {
     setLoading(true);
@@ -57,6 +69,7 @@ function ServiceDetail() {
     if (startTime) {
       fetchLogs();
     }
+    fetchUptime();
   }, []); // Remove dependency to prevent re-fetching on every render
 
   // Format date/time nicely
@@ -86,6 +99,27 @@ function ServiceDetail() {
         <ThemeToggle />
       </header>
 
+      {uptime && (
+        <div className="uptime-summary">
+          <h3>
+            30-Day Uptime: {uptime.uptime_percent !== null ? `${uptime.uptime_percent}%` : 'No data'}
+          </h3>
+          <div className="uptime-bars" style={{ display: 'flex', gap: '2px', alignItems: 'flex-end', height: '40px' }}>
+            {uptime.buckets.map((bucket) => (
+              <div
+                key={bucket.bucket_start}
+                title={`${new Date(bucket.bucket_start).toLocaleDateString()}: ${bucket.uptime_percent}% of ${bucket.checks} checks`}
+                style={{
+                  flex: 1,
+                  height: `${Math.max(bucket.uptime_percent || 0, 5)}%`,
+                  backgroundColor: bucket.uptime_percent >= 99 ? '#2e7d32' : bucket.uptime_percent >= 90 ? '#f9a825' : '#c62828',
+                }}
+              />
+            ))}
+          </div>
+        </div>
+      )}
+
       <div className="time-controls">
         <h3>Filter Logs by Time Range</h3>
         <div className="time-inputs">
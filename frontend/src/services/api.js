@@ -81,6 +81,9 @@ export const servicesApi = {
   // Get all services
   getAll: () => apiRequest('/services'),
 
+  // Get services changed since a previous poll's server_time
+  getChangedSince: (since) => apiRequest(`/services?since=${encodeURIComponent(since)}`),
+
   // Get single service
   getById: (id) => apiRequest(`/services/${id}`),
 
@@ -104,6 +107,14 @@ export const servicesApi = {
       method: 'DELETE',
     }),
 
+  // Get uptime history from the hourly/daily rollups
+  getUptime: (id, { from, to, bucket = 'day' } = {}) => {
+    const params = new URLSearchParams({ bucket });
+    if (from) params.append('from', from);
+    if (to) params.append('to', to);
+    return apiRequest(`/services/${id}/uptime?${params.toString()}`);
+  },
+
   // Sync Cloud Services
   syncCloud: () =>
     apiRequest('/cloud/sync', {
@@ -148,8 +159,34 @@ export const servicesApi = {
 
 // Monitoring API functions
 export const monitoringApi = {
-  // Monitor all services
-  monitorAll: () => apiRequest('/monitor/all', { method: 'POST' }),
+  // Monitor all services; results stream back as NDJSON and onResult sees each one as it lands
+  monitorAll: async (onResult = () => {}) => {
+    const response = await fetch(`${API_BASE_URL}/monitor/all`, {
+      method: 'POST',
+      headers: { 'x-api-key': getApiKey() },
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const results = [];
+    let buffered = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const lines = buffered.split('\n');
+      buffered = done ? '' : lines.pop();
+      lines.filter((line) => line.trim()).forEach((line) => {
+        const result = JSON.parse(line);
+        results.push(result);
+        onResult(result);
+      });
+      if (done) break;
+    }
+    return results;
+  },
 
   // Monitor single service
   monitorSingle: (id) => apiRequest(`/monitor/${id}`, { method: 'POST' }),
@@ -164,6 +201,10 @@ export const monitoringApi = {
       method: 'POST',
       body: JSON.stringify(filter),
     }),
+
+  // Live status/log events (EventSource cannot send headers, so the key goes in the query)
+  streamEvents: () =>
+    new EventSource(`${API_BASE_URL}/events?api_key=${encodeURIComponent(getApiKey())}`),
 };
 
 // Utility API functions